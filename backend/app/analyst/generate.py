@@ -2,16 +2,25 @@
 import os
 import re
 import sys
+import hashlib
+import threading
 import traceback
 from io import StringIO
 from contextlib import redirect_stdout
 from typing import Tuple, Dict, Any, Optional, Union, List
+from functools import lru_cache
+from types import CodeType
 import pandas as pd
+import matplotlib
+# Non-interactive backend: figures are only rendered to PNG, often off the main thread
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import seaborn as sns
 import io
 import base64
+import binascii
 import numpy as np
+from cachetools import TTLCache
 from .variable_mapper import VariableMapper, preprocess_code
 from .models import get_code_generator
 import logging
@@ -19,6 +28,17 @@ from .prompts import f1_prompt
 
 logger = logging.getLogger(__name__)
 
+# Extracted code by (model, prompt digest). The prompt embeds the query and the
+# DataFrame's schema and counts, so a hit means the model saw the same request.
+CODE_CACHE_SIZE = 1024
+CODE_CACHE_TTL = 3600  # seconds
+_code_cache: TTLCache = TTLCache(maxsize=CODE_CACHE_SIZE, ttl=CODE_CACHE_TTL)
+# generate_code runs on worker threads; TTLCache itself is not thread-safe
+_code_cache_lock = threading.Lock()
+
+# First fenced python block in a model response
+_CODE_BLOCK_RE = re.compile(r"```python\s*(.*?)\s*```", re.DOTALL)
+
 def generate_code(data: Union[pd.DataFrame, Dict[str, Any]], query: str, is_follow_up: bool = False) -> str:
     """Generate Python code for F1 data analysis based on the query"""
     try:
@@ -44,6 +64,13 @@ Focus on answering the specific follow-up question using the existing data.
         if is_follow_up:
             prompt += follow_up_context
 
+        cache_key = (generator.model, hashlib.blake2b(prompt.encode(), digest_size=16).digest())
+        with _code_cache_lock:
+            code = _code_cache.get(cache_key)
+        if code is not None:
+            logger.debug("Reusing generated code for identical prompt")
+            return code
+        
         # Get response from model
         content = generator.generate(prompt)
         
@@ -52,7 +79,9 @@ Focus on answering the specific follow-up question using the existing data.
         if code is None:
             logger.error("No code block found in response")
             return ""
-            
+        
+        with _code_cache_lock:
+            _code_cache[cache_key] = code
         return code
         
     except Exception as e:
@@ -61,16 +90,13 @@ Focus on answering the specific follow-up question using the existing data.
 
 def extract_code_block(response: str) -> Optional[str]:
     """Extract Python code block from model's response"""
-    pattern = r"```python\s*(.*?)\s*```"
-    matches = re.findall(pattern, response, re.DOTALL)
-    if not matches:
+    # Only the first block is used, so stop scanning once it is found
+    match = _CODE_BLOCK_RE.search(response)
+    if match is None:
         return None
         
     # Clean up the code block
-    code = matches[0]
-    code = code.replace('\\n', '\n')  # Convert escaped newlines
-    code = code.replace("\\'", "'")   # Convert escaped quotes
-    code = code.strip()
+    code = match.group(1).strip()
     
     # Remove any remaining markdown formatting
     if code.startswith('```python'):
@@ -80,6 +106,11 @@ def extract_code_block(response: str) -> Optional[str]:
     
     return code.strip()
 
+@lru_cache(maxsize=128)
+def _compile_generated(code: str) -> CodeType:
+    """Compile generated code once; repeated queries produce identical source"""
+    return compile(code, "<generated>", "exec")
+
 def execute_code_safely(code: str, data: pd.DataFrame) -> Tuple[bool, Dict[str, Any], str]:
     """Execute generated code in a safe environment"""
     try:
@@ -104,7 +135,8 @@ def execute_code_safely(code: str, data: pd.DataFrame) -> Tuple[bool, Dict[str,
             'print': print,
             'sns': sns,
             'io': io,
-            'base64': base64
+            'base64': base64,
+            'binascii': binascii
         }
         
         # Validate data
@@ -141,11 +173,9 @@ def execute_code_safely(code: str, data: pd.DataFrame) -> Tuple[bool, Dict[str,
 # Get the current figure
 fig = plt.gcf()
 
-# Save to buffer
 buffer = io.BytesIO()
 fig.savefig(buffer, format='png', bbox_inches='tight')
-buffer.seek(0)
-captured_figure = base64.b64encode(buffer.getvalue()).decode()
+captured_figure = binascii.b2a_base64(buffer.getbuffer(), newline=False).decode('ascii')
 """
         
         # Insert capture code before any plt.show()
@@ -155,7 +185,7 @@ captured_figure = base64.b64encode(buffer.getvalue()).decode()
             modified_code = modified_code + "\n" + capture_code
             
         # Execute the modified code
-        exec(modified_code, globals_dict)
+        exec(_compile_generated(modified_code), globals_dict)
         
         # Get the captured figure and output
         image_base64 = globals_dict.get('captured_figure', '')
@@ -1,6 +1,7 @@
 """Model implementations for code generation"""
 import os
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import Optional
 import pandas as pd
 from anthropic import Anthropic
@@ -24,7 +25,8 @@ class ClaudeCodeGenerator(CodeGenerator):
             temperature=0,
             messages=[{"role": "user", "content": prompt}]
         )
-        return str(response.content)
+        # Read the text blocks directly rather than parsing the list's repr
+        return "".join(block.text for block in response.content if block.type == "text")
 
 class GPT4CodeGenerator(CodeGenerator):
     def __init__(self):
@@ -43,15 +45,20 @@ class GPT4CodeGenerator(CodeGenerator):
             raise ValueError("GPT-4 returned None response")
         return content
 
+# Supported generators by model name; fixed at import, so the lookup table is built once
+CODE_GENERATORS = {
+    "claude": ClaudeCodeGenerator,
+    "gpt4": GPT4CodeGenerator
+}
+
 def get_code_generator(model_name: str = "claude") -> CodeGenerator:
     """Factory function to get the appropriate code generator"""
-    generators = {
-        "claude": ClaudeCodeGenerator,
-        "gpt4": GPT4CodeGenerator
-    }
-    
-    generator_class = generators.get(model_name.lower())
-    if not generator_class:
-        raise ValueError(f"Unknown model: {model_name}. Available models: {list(generators.keys())}")
+    if model_name.lower() not in CODE_GENERATORS:
+        raise ValueError(f"Unknown model: {model_name}. Available models: {list(CODE_GENERATORS)}")
     
-    return generator_class() 
\ No newline at end of file
+    return _shared_generator(model_name.lower())
+
+@lru_cache(maxsize=None)
+def _shared_generator(model_name: str) -> CodeGenerator:
+    """One generator per model, so its API client keeps its connection pool between requests"""
+    return CODE_GENERATORS[model_name]() 
\ No newline at end of file
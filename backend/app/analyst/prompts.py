@@ -1,21 +1,12 @@
 # prompts.py
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 import pandas as pd
 from io import StringIO
 import ast  # for safe evaluation of string literals
 
-def f1_prompt(df: pd.DataFrame, query: str) -> str:
-    """Generate a prompt for F1 data analysis"""
-    # Get DataFrame info
-    buffer = StringIO()
-    df.info(buf=buffer)
-    df_info = buffer.getvalue()
-    
-    # Get column descriptions
-    column_types = df.dtypes.to_dict()
-    column_info = "\n".join([f"- {col}: {dtype} - Handle as {dtype}" for col, dtype in column_types.items()])
-    
-    return f'''You are an F1 data analyst. Generate Python code to analyze and visualize F1 race data based on the user's query.
+# Static prompt body, formatted with the per-request DataFrame info and query
+_F1_PROMPT_TEMPLATE = '''You are an F1 data analyst. Generate Python code to analyze and visualize F1 race data based on the user's query.
 The data is available in a pandas DataFrame with the following structure:
 
 {df_info}
@@ -68,21 +59,38 @@ import ast  # for safe evaluation of string literals
 output = "[summary text]"
 '''
 
-def stable_prompt_with_error(df, question: str, error_message: str, previous_code: Optional[str] = None) -> str:
-    """Generate a prompt for error correction in F1 data analysis"""
-    prompt = f'''The previous code attempt resulted in this error:
+@lru_cache(maxsize=256)
+def _column_info(column_types: Tuple[Tuple[str, str], ...]) -> str:
+    """Column handling lines for a schema; cached since schemas repeat across queries"""
+    return "\n".join([f"- {col}: {dtype} - Handle as {dtype}" for col, dtype in column_types])
+
+def _df_info(df: pd.DataFrame) -> str:
+    """Capture df.info() as text rather than printing it"""
+    buffer = StringIO()
+    df.info(buf=buffer)
+    return buffer.getvalue()
+
+def f1_prompt(df: pd.DataFrame, query: str) -> str:
+    """Generate a prompt for F1 data analysis"""
+    # Get column descriptions
+    column_types = tuple((str(col), str(dtype)) for col, dtype in df.dtypes.items())
+    column_info = _column_info(column_types)
+    
+    return _F1_PROMPT_TEMPLATE.format(df_info=_df_info(df), column_info=column_info, query=query)
+
+_ERROR_PROMPT_TEMPLATE = '''The previous code attempt resulted in this error:
 {error_message}
 
-{"Previous code:" + previous_code if previous_code else ""}
+{previous_code}
 
 Please provide corrected Python code for the F1 analysis question:
 {question}
 
 DataFrame structure:
-{df.info()}
+{df_info}
 
 First few rows:
-{df.head().to_string()}
+{head}
 
 Requirements:
 - Fix the error in the code
@@ -94,17 +102,24 @@ Requirements:
 
 Respond ONLY with a Python code block that creates the visualization. The DataFrame 'data' is already loaded.
 '''
-    return prompt
 
-def custom_prompt(df, question: str) -> str:
-    """Generate a prompt for F1 data analysis, with focus on time-series visualization"""
-    prompt = f'''You are an F1 data analyst creating visualizations. You are writing a code that will be executed with an existing DataFrame 'data' that contains F1 race data with the following structure:
+def stable_prompt_with_error(df, question: str, error_message: str, previous_code: Optional[str] = None) -> str:
+    """Generate a prompt for error correction in F1 data analysis"""
+    return _ERROR_PROMPT_TEMPLATE.format(
+        error_message=error_message,
+        previous_code="Previous code:" + previous_code if previous_code else "",
+        question=question,
+        df_info=_df_info(df),
+        head=df.head().to_string()
+    )
+
+_CUSTOM_PROMPT_TEMPLATE = '''You are an F1 data analyst creating visualizations. You are writing a code that will be executed with an existing DataFrame 'data' that contains F1 race data with the following structure:
 
 DataFrame Info:
-{df.info()}
+{df_info}
 
 First few rows:
-{df.head().to_string()}
+{head}
 
 Question: {question}
 
@@ -114,4 +129,7 @@ Please provide a Python code solution that:
 3. Includes necessary imports (matplotlib.pyplot as plt, seaborn as sns, numpy as np)
 4. Creates clear and informative visualizations
 '''
-    return prompt
+
+def custom_prompt(df, question: str) -> str:
+    """Generate a prompt for F1 data analysis, with focus on time-series visualization"""
+    return _CUSTOM_PROMPT_TEMPLATE.format(df_info=_df_info(df), head=df.head().to_string(), question=question)
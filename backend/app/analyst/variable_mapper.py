@@ -1,6 +1,21 @@
 from typing import Dict, List, Tuple
 import pandas as pd
 
+# Rewrites applied by preprocess_code; fixed, so built once at import.
+# Only the first data-loading statement found is replaced.
+_CODE_DATA_LOADING_REPLACEMENTS = (
+    ("data = pd.read_clipboard(sep='\\s+')", "data = df.copy()"),
+    ("data = pd.read_clipboard()", "data = df.copy()"),
+    ("data = pd.read_csv('typeracer_data.csv')", "data = df.copy()"),
+    ("pd.read_clipboard()", "df.copy()"),
+)
+_COLUMN_REPLACEMENTS = (
+    ("data['speed']", "data['wpm']"),
+    ("data['accuracy']", "data['ac']"),
+    ("df['speed']", "df['wpm']"),
+    ("df['accuracy']", "df['ac']"),
+)
+
 class VariableMapper:
     """Maps semantic variable names to actual database columns"""
     
@@ -42,11 +57,8 @@ class VariableMapper:
     
     def analyze_question(self, question: str) -> List[str]:
         """Analyze question text to identify required variables"""
-        semantic_vars = []
-        for var in self.COMMON_MAPPINGS.keys():
-            if var in question.lower():
-                semantic_vars.append(var)
-        return semantic_vars
+        lowered = question.lower()
+        return [var for var in self.COMMON_MAPPINGS if var in lowered]
 
 def preprocess_code(code: str, mapper: VariableMapper) -> Tuple[str, Dict[str, str]]:
     """Preprocess code to use correct column names"""
@@ -54,14 +66,7 @@ def preprocess_code(code: str, mapper: VariableMapper) -> Tuple[str, Dict[str, s
     used_mappings = {}
     
     # Replace data loading statements
-    data_loading_replacements = {
-        "data = pd.read_clipboard(sep='\\s+')" : "data = df.copy()",
-        "data = pd.read_clipboard()" : "data = df.copy()",
-        "data = pd.read_csv('typeracer_data.csv')" : "data = df.copy()",
-        "pd.read_clipboard()" : "df.copy()"
-    }
-    
-    for old, new in data_loading_replacements.items():
+    for old, new in _CODE_DATA_LOADING_REPLACEMENTS:
         if old in modified_code:
             modified_code = modified_code.replace(old, new)
             break
@@ -71,14 +76,7 @@ def preprocess_code(code: str, mapper: VariableMapper) -> Tuple[str, Dict[str, s
         used_mappings = {'speed': 'wpm', 'accuracy': 'ac'}
         
         # Replace any alternative references to these columns
-        column_replacements = {
-            "data['speed']": "data['wpm']",
-            "data['accuracy']": "data['ac']",
-            "df['speed']": "df['wpm']",
-            "df['accuracy']": "df['ac']"
-        }
-        
-        for old, new in column_replacements.items():
+        for old, new in _COLUMN_REPLACEMENTS:
             modified_code = modified_code.replace(old, new)
     
     return modified_code, used_mappings
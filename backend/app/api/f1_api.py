@@ -1,6 +1,7 @@
 """F1 API handling and response processing"""
 
 from typing import Dict, Any, Optional, List
+from contextlib import nullcontext
 import httpx
 import pandas as pd
 from datetime import datetime
@@ -8,6 +9,8 @@ from ratelimit import limits, sleep_and_retry
 
 ERGAST_BASE_URL = "http://ergast.com/api/f1"
 CALLS_PER_SECOND = 4
+# Fill value for optional fields, matching what DataFrame gives missing keys
+_MISSING = float('nan')
 
 class F1ResponseProcessor:
     """Process different types of F1 API responses into DataFrames"""
@@ -28,62 +31,104 @@ class F1ResponseProcessor:
     def process_race_results(data: Dict[str, Any]) -> pd.DataFrame:
         """Process race results data"""
         races = data['MRData']['RaceTable']['Races']
-        results = []
+        # One list per output column, filled in a single pass
+        race_names, circuits, dates, seasons, rounds = [], [], [], [], []
+        drivers, constructors, positions, points, statuses, grids, laps = [], [], [], [], [], [], []
+        lap_ranks, lap_times, lap_speeds = [], [], []
+        has_fastest_lap = False
         
         for race in races:
-            race_info = {
-                'race_name': race['raceName'],
-                'circuit': race['Circuit']['circuitName'],
-                'date': race['date'],
-                'season': race['season'],
-                'round': race['round']
-            }
+            race_name = race['raceName']
+            circuit = race['Circuit']['circuitName']
+            date = race['date']
+            season = race['season']
+            round_ = race['round']
             
             for result in race['Results']:
-                row = {
-                    **race_info,
-                    'driver': f"{result['Driver']['givenName']} {result['Driver']['familyName']}",
-                    'constructor': result['Constructor']['name'],
-                    'position': int(result['position']),
-                    'points': float(result['points']),
-                    'status': result['status'],
-                    'grid': int(result['grid']),
-                    'laps': int(result['laps'])
-                }
+                driver = result['Driver']
+                race_names.append(race_name)
+                circuits.append(circuit)
+                dates.append(date)
+                seasons.append(season)
+                rounds.append(round_)
+                drivers.append(f"{driver['givenName']} {driver['familyName']}")
+                constructors.append(result['Constructor']['name'])
+                positions.append(int(result['position']))
+                points.append(float(result['points']))
+                statuses.append(result['status'])
+                grids.append(int(result['grid']))
+                laps.append(int(result['laps']))
                 
                 # Add fastest lap if available
-                if 'FastestLap' in result:
-                    row.update({
-                        'fastest_lap_rank': int(result['FastestLap']['rank']),
-                        'fastest_lap_time': result['FastestLap']['Time']['time'],
-                        'fastest_lap_speed': float(result['FastestLap']['AverageSpeed']['speed'])
-                    })
-                
-                results.append(row)
+                fastest_lap = result.get('FastestLap')
+                if fastest_lap is not None:
+                    has_fastest_lap = True
+                    lap_ranks.append(int(fastest_lap['rank']))
+                    lap_times.append(fastest_lap['Time']['time'])
+                    lap_speeds.append(float(fastest_lap['AverageSpeed']['speed']))
+                else:
+                    lap_ranks.append(_MISSING)
+                    lap_times.append(_MISSING)
+                    lap_speeds.append(_MISSING)
         
-        return pd.DataFrame(results)
+        if not race_names:
+            return pd.DataFrame()
+        columns = {
+            'race_name': race_names,
+            'circuit': circuits,
+            'date': dates,
+            'season': seasons,
+            'round': rounds,
+            'driver': drivers,
+            'constructor': constructors,
+            'position': positions,
+            'points': points,
+            'status': statuses,
+            'grid': grids,
+            'laps': laps
+        }
+        if has_fastest_lap:
+            columns['fastest_lap_rank'] = lap_ranks
+            columns['fastest_lap_time'] = lap_times
+            columns['fastest_lap_speed'] = lap_speeds
+        return pd.DataFrame(columns)
     
     @staticmethod
     def process_qualifying(data: Dict[str, Any]) -> pd.DataFrame:
         """Process qualifying data"""
         races = data['MRData']['RaceTable']['Races']
-        results = []
+        race_names, circuits, dates, drivers, constructors, positions = [], [], [], [], [], []
+        q1, q2, q3 = [], [], []
         
         for race in races:
+            race_name = race['raceName']
+            circuit = race['Circuit']['circuitName']
+            date = race['date']
             for quali in race['QualifyingResults']:
-                results.append({
-                    'race_name': race['raceName'],
-                    'circuit': race['Circuit']['circuitName'],
-                    'date': race['date'],
-                    'driver': f"{quali['Driver']['givenName']} {quali['Driver']['familyName']}",
-                    'constructor': quali['Constructor']['name'],
-                    'position': int(quali['position']),
-                    'Q1': quali.get('Q1', None),
-                    'Q2': quali.get('Q2', None),
-                    'Q3': quali.get('Q3', None)
-                })
+                driver = quali['Driver']
+                race_names.append(race_name)
+                circuits.append(circuit)
+                dates.append(date)
+                drivers.append(f"{driver['givenName']} {driver['familyName']}")
+                constructors.append(quali['Constructor']['name'])
+                positions.append(int(quali['position']))
+                q1.append(quali.get('Q1', None))
+                q2.append(quali.get('Q2', None))
+                q3.append(quali.get('Q3', None))
         
-        return pd.DataFrame(results)
+        if not race_names:
+            return pd.DataFrame()
+        return pd.DataFrame({
+            'race_name': race_names,
+            'circuit': circuits,
+            'date': dates,
+            'driver': drivers,
+            'constructor': constructors,
+            'position': positions,
+            'Q1': q1,
+            'Q2': q2,
+            'Q3': q3
+        })
     
     @staticmethod
     def process_standings(data: Dict[str, Any], standings_type: str = 'driver') -> pd.DataFrame:
@@ -116,12 +161,16 @@ class F1ResponseProcessor:
 
 @sleep_and_retry
 @limits(calls=CALLS_PER_SECOND, period=1)
-async def fetch_f1_data(endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    """Fetch data from F1 API with automatic response processing"""
+async def fetch_f1_data(endpoint: str, params: Optional[Dict[str, Any]] = None, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """Fetch data from F1 API with automatic response processing
+    
+    Uses the given client (and its connection pool) when provided,
+    otherwise a client opened and closed for this call.
+    """
     try:
         url = f"{ERGAST_BASE_URL}{endpoint}.json"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10.0)
+        async with (nullcontext(client) if client is not None else httpx.AsyncClient()) as http_client:
+            response = await http_client.get(url, params=params, timeout=10.0)
             response.raise_for_status()
             
             # Determine response type and process accordingly
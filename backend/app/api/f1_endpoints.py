@@ -1,7 +1,8 @@
 """F1 API endpoint configurations and fetching logic"""
 
 from typing import Dict, Any, Optional
-import requests
+from contextlib import nullcontext
+import httpx
 import pandas as pd
 from ratelimit import limits, sleep_and_retry
 
@@ -64,21 +65,23 @@ class F1Endpoints:
 
 @sleep_and_retry
 @limits(calls=CALLS_PER_SECOND, period=1)
-async def fetch_f1_data(endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+async def fetch_f1_data(endpoint: str, params: Optional[Dict[str, Any]] = None, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
     """
     Fetch data from F1 API with rate limiting
     
     Args:
         endpoint: API endpoint path (e.g., "/drivers")
         params: Optional query parameters
+        client: HTTP client to use; defaults to one opened for this call
         
     Returns:
         Dictionary containing the API response or error information
     """
     try:
         url = f"{ERGAST_BASE_URL}{endpoint}.json"
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
+        async with (nullcontext(client) if client is not None else httpx.AsyncClient()) as http_client:
+            response = await http_client.get(url, params=params, timeout=10.0)
+            response.raise_for_status()
         
         return {
             'success': True,
@@ -89,7 +92,8 @@ async def fetch_f1_data(endpoint: str, params: Optional[Dict[str, Any]] = None)
             }
         }
         
-    except requests.RequestException as e:
+    except (httpx.HTTPError, ValueError) as e:
+        # ValueError covers non-JSON bodies such as an HTML maintenance page
         return {
             'success': False,
             'error': str(e),
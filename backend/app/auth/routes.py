@@ -33,8 +33,10 @@ class LoginData(BaseModel):
     username: str
     password: str
 
+# Handlers are plain functions: the Session and password hashing both block,
+# so FastAPI runs them in its threadpool instead of on the event loop
 @router.post("/register", response_model=Token)
-async def register(
+def register(
     user_data: UserCreate,
     db: Session = Depends(get_db)
 ) -> Any:
@@ -68,22 +70,22 @@ async def register(
     )
 
 @router.post("/token", response_model=Token)
-async def login(
+def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ) -> Any:
     """Handle OAuth2 form-based login"""
-    return await authenticate_user(form_data.username, form_data.password, db)
+    return authenticate_user(form_data.username, form_data.password, db)
 
 @router.post("/login", response_model=Token)
-async def login_json(
+def login_json(
     login_data: LoginData,
     db: Session = Depends(get_db)
 ) -> Any:
     """Handle JSON-based login"""
-    return await authenticate_user(login_data.username, login_data.password, db)
+    return authenticate_user(login_data.username, login_data.password, db)
 
-async def authenticate_user(username: str, password: str, db: Session) -> Token:
+def authenticate_user(username: str, password: str, db: Session) -> Token:
     """Common authentication logic"""
     # Find user
     user = db.query(User).filter(User.username == username).first()
@@ -1,13 +1,19 @@
 """Main application integrating F1 data pipeline with analysis"""
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
+import io
 import logging
+import threading
 import pandas as pd
-import json
 import ast
+import httpx
+import orjson
+from cachetools import TTLCache
 
 # FastAPI and Pydantic
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
@@ -17,7 +23,8 @@ from app.database import get_db, SessionLocal
 from sqlalchemy.orm import Session
 
 # Custom components
-from app.query.processor import QueryProcessor
+from app.query.models import DataRequirements
+from app.query.processor import QueryProcessor, get_processor
 from app.pipeline.data2 import DataPipeline
 from app.pipeline.optimized_adapters import OptimizedQueryAdapter, OptimizedResultAdapter
 from app.analyst.generate import generate_code, execute_code_safely
@@ -25,8 +32,51 @@ from app.analyst.generate import generate_code, execute_code_safely
 # Set up logging with more detail
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
+# Per-request connection logs from the API clients drown out the pipeline's own
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("httpcore").setLevel(logging.WARNING)
 
-app = FastAPI()
+def _warm_plotting():
+    """Render one throwaway figure so font cache and Agg setup happen before the first request"""
+    # Imported here so app.analyst.generate has already selected the Agg backend
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [0, 1])
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+
+# Keep-alive Ergast client owned by the lifespan; None (e.g. outside it) opens one per fetch
+_ergast_client: Optional[httpx.AsyncClient] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _ergast_client
+    # One-time plotting setup costs hundreds of milliseconds; pay it at worker start
+    await asyncio.to_thread(_warm_plotting)
+    _ergast_client = httpx.AsyncClient()
+    yield
+    await _ergast_client.aclose()
+    _ergast_client = None
+    if get_processor.cache_info().currsize:
+        await get_processor().aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Generated code draws on pyplot's global figure state, so executions take turns
+_execution_lock = asyncio.Lock()
+
+# Seconds a fetched data set is reused by later requests with the same requirements
+PIPELINE_CACHE_TTL = 60
+FRAME_CACHE_SIZE = 64
+
+# Shared across requests so their caches outlive a single call
+_query_adapter = OptimizedQueryAdapter()
+_result_adapter = OptimizedResultAdapter()
+# Cleaned analysis DataFrame and pipeline metadata by DataRequirements; the
+# generated code only ever sees copies of the frame
+_frame_cache: TTLCache = TTLCache(maxsize=FRAME_CACHE_SIZE, ttl=PIPELINE_CACHE_TTL)
+# TTLCache itself is not thread-safe
+_frame_cache_lock = threading.Lock()
 
 # Add CORS middleware
 app.add_middleware(
@@ -46,8 +96,8 @@ def validate_constructor_data(data: Any) -> List[Dict]:
     if isinstance(data, str):
         try:
             # Try to parse string as JSON first
-            data = json.loads(data)
-        except json.JSONDecodeError:
+            data = orjson.loads(data)
+        except orjson.JSONDecodeError:
             try:
                 # If JSON fails, try ast.literal_eval
                 data = ast.literal_eval(data)
@@ -127,91 +177,148 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
+def build_analysis_frame(results: Any) -> pd.DataFrame:
+    """Build the cleaned, normalized DataFrame the analysis code runs against"""
+    # Handle different result types
+    if isinstance(results, pd.DataFrame):
+        logger.debug("Results is already a DataFrame")
+        df = results
+    elif isinstance(results, dict):
+        df = pd.DataFrame([results])
+    elif isinstance(results, list):
+        df = pd.DataFrame(results)
+    else:
+        logger.error(f"Unexpected results type: {type(results)}")
+        raise ValueError(f"Cannot process results of type: {type(results)}")
+    
+    # Clean the DataFrame before normalization
+    df = clean_dataframe(df)
+    logger.debug(f"DataFrame shape after cleaning: {df.shape}")
+    logger.debug(f"Columns after cleaning: {list(df.columns)}")
+    
+    # Normalize the constructor data
+    df = normalize_constructor_data(df)
+    logger.debug(f"Final DataFrame shape: {df.shape}")
+    logger.debug(f"Final columns: {list(df.columns)}")
+    logger.debug(f"Data types: {df.dtypes}")
+    return df
+
+def _json_default(value: Any) -> Any:
+    # pandas Timestamps and similar keep the ISO format jsonable_encoder gave them
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def json_response(payload: Dict[str, Any], status_code: int = 200) -> Response:
+    """Encode a response body with orjson in one pass, skipping FastAPI's jsonable_encoder"""
+    return Response(
+        status_code=status_code,
+        content=orjson.dumps(
+            payload,
+            default=_json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ),
+        media_type="application/json"
+    )
+
+async def load_analysis_frame(requirements: DataRequirements, start_time: float) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Run the data pipeline and build the cleaned analysis DataFrame; raises
+    HTTPException when there is nothing to analyze
+    """
+    # Process through optimized pipeline
+    pipeline_response = await DataPipeline(client=_ergast_client).process(requirements)
+    logger.debug(f"Pipeline response type: {type(pipeline_response)}")
+    
+    # Adapt pipeline result
+    pipeline_result = await _result_adapter.adapt_pipeline_result(pipeline_response, start_time)
+    logger.debug(f"Pipeline result success: {pipeline_result.success}")
+    
+    if not pipeline_result.success or pipeline_result.data is None:
+        logger.error(f"Pipeline failed: {pipeline_result.error}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Pipeline processing failed: {pipeline_result.error or 'No data returned'}"
+        )
+        
+    # Build the DataFrame the analysis code runs against
+    results = pipeline_result.data.get('results', {})
+    logger.debug(f"Raw results type: {type(results)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        raw = orjson.dumps(results, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        logger.debug(f"Raw results structure: {raw[:500].decode(errors='ignore')}...")
+    
+    try:
+        df = build_analysis_frame(results)
+        if df.empty:
+            raise HTTPException(status_code=400, detail="No data available after processing")
+    except Exception as e:
+        logger.error(f"DataFrame processing error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Failed to process data: {str(e)}")
+    
+    return df, pipeline_result.metadata
+
+async def processor_dependency() -> Optional[QueryProcessor]:
+    """Shared query processor, or None when it cannot be set up (e.g. no API key)"""
+    # Async so the processor and its client are created on the event loop, not in the threadpool
+    try:
+        return get_processor()
+    except Exception as e:
+        logger.error(f"Query processor setup failed: {str(e)}")
+        return None
+
 @app.post("/api/v1/analyze")
-async def analyze_f1_data(request: QueryRequest) -> Dict[str, Any]:
+async def analyze_f1_data(
+    request: QueryRequest,
+    processor: Optional[QueryProcessor] = Depends(processor_dependency)
+) -> Response:
     """
     Process F1 data analysis queries using the optimized pipeline.
     
     Args:
         request: QueryRequest containing the natural language query
+        processor: Shared query processor, None if it could not be set up
         
     Returns:
-        Dict containing analysis results, executed code, and processing metadata
+        JSON response with analysis results, executed code, and processing metadata
     """
     try:
         start_time = datetime.now().timestamp()
+        if processor is None:
+            return json_response({
+                "success": False,
+                "error": "Analysis failed",
+                "details": "Query processor is not available",
+                "processing_time": datetime.now().timestamp() - start_time
+            }, status_code=503)
         logger.debug(f"Starting analysis with query: {request.query}")
         
         # Step 1: Process query
-        processor = QueryProcessor()
         query_result = await processor.process_query(request.query)
         logger.debug(f"Query processing result: {query_result}")
         
         # Step 2: Adapt query using optimized adapter
-        query_adapter = OptimizedQueryAdapter()
-        adapted_result = await query_adapter.adapt(query_result)
+        adapted_result = await _query_adapter.adapt(query_result)
         logger.debug(f"Adapted query result: {adapted_result}")
         
-        # Step 3: Process through optimized pipeline
-        pipeline = DataPipeline()
+        # Step 3: Fetch the data, unless a recent request already built its frame
         requirements = adapted_result.to_data_requirements()
-        pipeline_response = await pipeline.process(requirements)
-        logger.debug(f"Pipeline response type: {type(pipeline_response)}")
-        
-        # Step 4: Adapt pipeline result
-        result_adapter = OptimizedResultAdapter()
-        pipeline_result = await result_adapter.adapt_pipeline_result(pipeline_response, start_time)
-        logger.debug(f"Pipeline result success: {pipeline_result.success}")
-        
-        if not pipeline_result.success or pipeline_result.data is None:
-            logger.error(f"Pipeline failed: {pipeline_result.error}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Pipeline processing failed: {pipeline_result.error or 'No data returned'}"
-            )
-            
-        # Step 5: Generate and execute analysis code
-        results = pipeline_result.data.get('results', {})
-        logger.debug(f"Raw results type: {type(results)}")
-        logger.debug(f"Raw results structure: {json.dumps(results, default=str)[:500]}...")
-        
-        try:
-            # Handle different result types
-            if isinstance(results, pd.DataFrame):
-                logger.debug("Results is already a DataFrame")
-                df = results
-            elif isinstance(results, dict):
-                df = pd.DataFrame([results])
-            elif isinstance(results, list):
-                df = pd.DataFrame(results)
-            else:
-                logger.error(f"Unexpected results type: {type(results)}")
-                raise ValueError(f"Cannot process results of type: {type(results)}")
-            
-            # Clean the DataFrame before normalization
-            df = clean_dataframe(df)
-            logger.debug(f"DataFrame shape after cleaning: {df.shape}")
-            logger.debug(f"Columns after cleaning: {list(df.columns)}")
-            
-            # Normalize the constructor data
-            df = normalize_constructor_data(df)
-            logger.debug(f"Final DataFrame shape: {df.shape}")
-            logger.debug(f"Final columns: {list(df.columns)}")
-            logger.debug(f"Data types: {df.dtypes}")
-            
-            if df.empty:
-                raise HTTPException(status_code=400, detail="No data available after processing")
-                
-        except Exception as e:
-            logger.error(f"DataFrame processing error: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=400, detail=f"Failed to process data: {str(e)}")
+        with _frame_cache_lock:
+            cached = _frame_cache.get(requirements)
+        if cached is not None:
+            logger.debug(f"Reusing cached DataFrame for {requirements.endpoint}")
+            df, metadata = cached
+        else:
+            df, metadata = await load_analysis_frame(requirements, start_time)
+            with _frame_cache_lock:
+                _frame_cache[requirements] = (df, metadata)
         
-        # Generate and execute code with additional logging
+        # Generate and execute code with additional logging. Both block (a model
+        # call, then exec and plotting), so they run off the event loop thread
         logger.debug("Generating analysis code")
-        code = generate_code(df, request.query)
+        code = await asyncio.to_thread(generate_code, df, request.query)
         logger.debug(f"Generated code: {code}")
         
-        success, result, executed_code = execute_code_safely(code, df)
+        async with _execution_lock:
+            success, result, executed_code = await asyncio.to_thread(execute_code_safely, code, df)
         logger.debug(f"Code execution success: {success}")
         
         if not success:
@@ -222,32 +329,39 @@ async def analyze_f1_data(request: QueryRequest) -> Dict[str, Any]:
             )
             
         # Return comprehensive result
-        return {
+        return json_response({
             "success": True,
             "data": result,
             "executed_code": executed_code,
             "query_trace": query_result.trace,
             "processing_time": datetime.now().timestamp() - start_time,
-            "metadata": pipeline_result.metadata
-        }
+            "metadata": metadata
+        })
         
     except HTTPException as e:
         logger.error(f"HTTP Exception: {str(e)}")
-        return {
+        return json_response({
             "success": False,
             "error": "Analysis failed",
             "details": e.detail,
             "processing_time": datetime.now().timestamp() - start_time
-        }
+        })
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-        return {
+        return json_response({
             "success": False,
             "error": "Analysis failed",
             "details": str(e),
             "processing_time": datetime.now().timestamp() - start_time
-        }
+        })
+
+@app.post("/api/v1/cache/invalidate")
+async def invalidate_cache() -> Dict[str, Any]:
+    """Drop cached analysis frames so the next requests fetch fresh data"""
+    with _frame_cache_lock:
+        _frame_cache.clear()
+    return {"success": True}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
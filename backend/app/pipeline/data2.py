@@ -1,7 +1,9 @@
 """Enhanced Data Pipeline with support for historical and complex queries"""
 
 import asyncio
+import re
 from typing import Dict, Any, List, Optional, Union, cast
+import httpx
 import pandas as pd
 from datetime import datetime
 from dataclasses import dataclass
@@ -9,6 +11,15 @@ from ..query.models import DataRequirements, ProcessingResult
 from ..api.f1_api import fetch_f1_data
 from ..api.f1_endpoints import build_endpoint
 
+# Keyword classifiers compiled once; a single case-insensitive scan replaces
+# lowercasing the value and testing each term in turn
+_HISTORICAL_TERMS_RE = re.compile(r"since|from|decade|between", re.IGNORECASE)
+_CAREER_TERMS_RE = re.compile(r"career|all time|lifetime|overall", re.IGNORECASE)
+
+# Params the F1 API reads from the query string; the rest are encoded in the
+# endpoint path by build_endpoint and would only be ignored by the server
+API_QUERY_PARAMS = frozenset({'limit', 'offset'})
+
 @dataclass
 class DataResponse:
     """Response from data pipeline"""
@@ -30,20 +41,18 @@ class DataRequirementsSplitter:
         start_year = None
         end_year = datetime.now().year
         
-        # Parse various time formats
-        if isinstance(params.get('year'), list):
-            years = params['year']
-            if years:
-                start_year = min(int(y) for y in years)
-                end_year = max(int(y) for y in years)
-        elif isinstance(params.get('season'), list):  # Backward compatibility
-            years = params['season']
-            if years:
-                start_year = min(int(y) for y in years)
-                end_year = max(int(y) for y in years)
-        elif 'since' in str(params.get('year', '')):
-            start_year = int(str(params['year']).split('since')[-1].strip())
-        elif 'last decade' in str(params.get('year', '')):
+        # Parse various time formats; 'season' is accepted for backward compatibility
+        year_list = params.get('year') if isinstance(params.get('year'), list) else params.get('season')
+        year_text = str(params.get('year', ''))
+        if isinstance(year_list, list):
+            if year_list:
+                # Convert each year once, then take both bounds
+                years = [int(y) for y in year_list]
+                start_year = min(years)
+                end_year = max(years)
+        elif 'since' in year_text:
+            start_year = int(year_text.split('since')[-1].strip())
+        elif 'last decade' in year_text:
             start_year = end_year - 10
         
         if not start_year:
@@ -87,6 +96,10 @@ class DataRequirementsSplitter:
 class DataPipeline:
     """Enhanced pipeline for processing F1 data requests"""
     
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        # Shared HTTP client reused for every fetch; None opens one per request
+        self.client = client
+    
     async def process(self, requirements: Any) -> Dict[str, Any]:
         """Process data requirements with support for complex queries"""
         try:
@@ -117,14 +130,12 @@ class DataPipeline:
             return True
         if isinstance(params.get('season'), list) and len(params['season']) > 1:  # Backward compatibility
             return True
-        year_str = str(params.get('year', ''))
-        return any(term in year_str.lower() for term in ['since', 'from', 'decade', 'between'])
+        return _HISTORICAL_TERMS_RE.search(str(params.get('year', ''))) is not None
     
     def _is_career_query(self, requirements: Any) -> bool:
         """Check if query requires career-wide data processing"""
         params = requirements.params
-        query_str = str(params.get('query', '')).lower()
-        return any(term in query_str for term in ['career', 'all time', 'lifetime', 'overall'])
+        return _CAREER_TERMS_RE.search(str(params.get('query', ''))) is not None
     
     def _is_multi_entity_query(self, requirements: Any) -> bool:
         """Check if query involves multiple entities"""
@@ -149,7 +160,7 @@ class DataPipeline:
         
         # Merge results with year tracking
         success = True
-        merged_data = {'results': pd.DataFrame()}
+        frames = []
         errors = []
         
         for i, result in enumerate(results):
@@ -165,13 +176,13 @@ class DataPipeline:
             else:
                 result_data = result_dict.get('data', {})
                 if isinstance(result_data, dict):
-                    df = result_data.get('results', pd.DataFrame())
-                    if not df.empty:
+                    df = result_data.get('results')
+                    if df is not None and len(df.index) > 0:
                         df['year'] = split_reqs[i]['metadata']['year']
-                        if merged_data['results'].empty:
-                            merged_data['results'] = df
-                        else:
-                            merged_data['results'] = pd.concat([merged_data['results'], df], ignore_index=True)
+                        frames.append(df)
+        
+        # One concat for all years instead of re-copying the merged frame per year
+        merged_data = {'results': pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()}
         
         return {
             'success': success and not merged_data['results'].empty,
@@ -259,33 +270,26 @@ class DataPipeline:
                 }
             }
         
-        # Process entities in batches
+        # At most batch_size fetches in flight; a slot frees as soon as any
+        # fetch finishes rather than when its whole batch does
         batch_size = 4
-        all_results = []
+        semaphore = asyncio.Semaphore(batch_size)
         
-        for i in range(0, len(entities), batch_size):
-            batch = entities[i:i + batch_size]
-            batch_tasks = []
-            
-            for entity in batch:
-                entity_params = base_params.copy()
-                entity_params[entity_type] = entity
-                single_req = type(requirements)(
-                    endpoint=requirements.endpoint,
-                    params=entity_params
-                )
-                batch_tasks.append(self._process_single(single_req))
-            
-            # Execute batch with retry logic
-            try:
-                batch_results = await asyncio.gather(*batch_tasks, return_exceptions=True)
-                all_results.extend(batch_results)
-            except Exception as e:
-                print(f"Error processing batch {i//batch_size + 1}: {str(e)}")
+        async def fetch_entity(entity: Any) -> Dict[str, Any]:
+            entity_params = base_params.copy()
+            entity_params[entity_type] = entity
+            single_req = type(requirements)(
+                endpoint=requirements.endpoint,
+                params=entity_params
+            )
+            async with semaphore:
+                return await self._process_single(single_req)
+        
+        all_results = await asyncio.gather(*(fetch_entity(entity) for entity in entities), return_exceptions=True)
         
         # Merge results
         success = True
-        merged_data = {'results': pd.DataFrame()}
+        frames = []
         errors = []
         
         for i, result in enumerate(all_results):
@@ -301,13 +305,12 @@ class DataPipeline:
             else:
                 result_data = result_dict.get('data', {})
                 if isinstance(result_data, dict):
-                    df = result_data.get('results', pd.DataFrame())
-                    if not df.empty:
+                    df = result_data.get('results')
+                    if df is not None and len(df.index) > 0:
                         df[entity_type] = entities[i]
-                        if merged_data['results'].empty:
-                            merged_data['results'] = df
-                        else:
-                            merged_data['results'] = pd.concat([merged_data['results'], df], ignore_index=True)
+                        frames.append(df)
+        
+        merged_data = {'results': pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()}
         
         return {
             'success': success and not merged_data['results'].empty,
@@ -364,7 +367,10 @@ class DataPipeline:
                         }
                     }
 
-                response = await fetch_f1_data(full_endpoint, params)
+                # Filtering happens in the path and paging in limit/offset, so the
+                # API returns only the rows asked for
+                query_params = {k: v for k, v in params.items() if k in API_QUERY_PARAMS}
+                response = await fetch_f1_data(full_endpoint, query_params or None, client=self.client)
                 
                 # Handle dictionary response from fetch_f1_data
                 if not isinstance(response, dict):
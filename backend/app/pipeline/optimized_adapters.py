@@ -4,12 +4,13 @@ Includes caching, parallel processing, and performance optimizations.
 """
 
 import asyncio
-from dataclasses import dataclass
+from contextlib import suppress
+from dataclasses import dataclass, field
 from typing import Dict, Any, Optional, List, Union, Tuple, TypeVar, Sequence, cast, Callable
 from functools import lru_cache
 from datetime import datetime
 import hashlib
-import json
+import orjson
 from concurrent.futures import ThreadPoolExecutor
 
 from ..query.processor import ProcessingResult
@@ -23,12 +24,13 @@ class CacheKey:
     """Cache key for query results"""
     endpoint: str
     params_hash: str
-    timestamp: float
+    # Creation time drives expiry only; keys for the same query must compare equal
+    timestamp: float = field(compare=False)
 
     @classmethod
     def from_query(cls, endpoint: str, params: Dict[str, Any]) -> "CacheKey":
-        params_str = json.dumps(params, sort_keys=True)
-        params_hash = hashlib.sha256(params_str.encode()).hexdigest()
+        params_bytes = orjson.dumps(params, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        params_hash = hashlib.sha256(params_bytes).hexdigest()
         return cls(
             endpoint=endpoint,
             params_hash=params_hash,
@@ -42,7 +44,8 @@ class CacheManager:
     """Manages caching for adapted results"""
     
     def __init__(self, max_size: int = 1000, ttl: int = 3600):
-        self.cache: Dict[CacheKey, Any] = {}
+        # key -> (stored at, item); expiry uses the store time, not the lookup key's
+        self.cache: Dict[CacheKey, Tuple[float, Any]] = {}
         self.max_size = max_size
         self.ttl = ttl
         self._lock = asyncio.Lock()
@@ -54,8 +57,8 @@ class CacheManager:
             
         async with self._lock:
             if key in self.cache:
-                item = self.cache[key]
-                if datetime.now().timestamp() - key.timestamp < self.ttl:
+                stored_at, item = self.cache[key]
+                if datetime.now().timestamp() - stored_at < self.ttl:
                     return item
                 else:
                     del self.cache[key]
@@ -69,12 +72,17 @@ class CacheManager:
         async with self._lock:
             if len(self.cache) >= self.max_size:
                 # Remove oldest items
-                sorted_keys = sorted(self.cache.keys(), key=lambda k: k.timestamp)
+                sorted_keys = sorted(self.cache, key=lambda k: self.cache[k][0])
                 for old_key in sorted_keys[:len(self.cache) // 4]:  # Remove 25% oldest
                     del self.cache[old_key]
-            self.cache[key] = value
+            self.cache[key] = (key.timestamp, value)
 
-@dataclass
+    async def clear(self):
+        """Drop every cached item"""
+        async with self._lock:
+            self.cache.clear()
+
+@dataclass(slots=True)
 class OptimizedQueryResult:
     """Enhanced query result with caching and validation"""
     endpoint: str
@@ -236,12 +244,44 @@ class ParallelFetchManager:
                 error=str(e)
             )
 
+# Base endpoint type -> adapted endpoint; other types map to "<TYPE>.year"
+ENDPOINT_TYPES = {
+    'drivers': 'DRIVERS.year',
+    'qualifying': 'QUALIFYING.race',
+    'results': 'RESULTS.race',
+    'races': 'RESULTS.race',
+    'pitstops': 'RESULTS.race'
+}
+
+@lru_cache(maxsize=256)
+def _adapt_endpoint(endpoint: str) -> str:
+    """Map an /api/f1/ endpoint to its adapted form; other endpoints pass through"""
+    if not endpoint.startswith('/api/f1/'):
+        return endpoint
+    # Extract the base endpoint type
+    base = endpoint[8:].strip('/').split('/')[0]
+    return ENDPOINT_TYPES.get(base) or f"{base.upper()}.year"
+
 class OptimizedQueryAdapter:
     """Adapter for optimizing query results with caching"""
     
-    def __init__(self):
+    def __init__(self, max_requirements: int = 256):
         self.cache_manager = CacheManager()
         self.parallel_processor = ParallelProcessor()
+        self._req_cache: Dict[Tuple[str, str], DataRequirements] = {}
+        self.max_requirements = max_requirements
+    
+    def cached_to_data_requirements(self, result: OptimizedQueryResult) -> DataRequirements:
+        """Convert to DataRequirements, reusing the conversion for identical endpoint/params"""
+        cache_key = result.cache_key or CacheKey.from_query(result.endpoint, result.params)
+        key = (result.endpoint, cache_key.params_hash)
+        requirements = self._req_cache.get(key)
+        if requirements is None:
+            if len(self._req_cache) >= self.max_requirements:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._req_cache[next(iter(self._req_cache))]
+            requirements = self._req_cache[key] = result.to_data_requirements()
+        return requirements
     
     async def adapt(self, result: Union[ProcessingResult, Dict[str, Any]]) -> OptimizedQueryResult:
         """Adapt a query result with caching and optimization"""
@@ -266,20 +306,7 @@ class OptimizedQueryAdapter:
         """Initial adaptation of a query result"""
         if isinstance(result, ProcessingResult):
             # Convert endpoint format if needed
-            endpoint = result.requirements.endpoint
-            if endpoint.startswith('/api/f1/'):
-                # Extract the base endpoint type
-                parts = endpoint[8:].strip('/').split('/')
-                if parts[0] == 'drivers':
-                    endpoint = 'DRIVERS.year'
-                elif parts[0] == 'qualifying':
-                    endpoint = 'QUALIFYING.race'
-                elif parts[0] in ['results', 'races']:
-                    endpoint = 'RESULTS.race'
-                elif parts[0] == 'pitstops':
-                    endpoint = 'RESULTS.race'
-                else:
-                    endpoint = f"{parts[0].upper()}.year"
+            endpoint = _adapt_endpoint(result.requirements.endpoint)
             
             # Convert parameters
             params = dict(result.requirements.params)
@@ -313,20 +340,7 @@ class OptimizedQueryAdapter:
         """Synchronous adaptation of a single result"""
         if isinstance(result, ProcessingResult):
             # Convert endpoint format if needed
-            endpoint = result.requirements.endpoint
-            if endpoint.startswith('/api/f1/'):
-                # Extract the base endpoint type
-                parts = endpoint[8:].strip('/').split('/')
-                if parts[0] == 'drivers':
-                    endpoint = 'DRIVERS.year'
-                elif parts[0] == 'qualifying':
-                    endpoint = 'QUALIFYING.race'
-                elif parts[0] in ['results', 'races']:
-                    endpoint = 'RESULTS.race'
-                elif parts[0] == 'pitstops':
-                    endpoint = 'RESULTS.race'
-                else:
-                    endpoint = f"{parts[0].upper()}.year"
+            endpoint = _adapt_endpoint(result.requirements.endpoint)
             
             # Convert parameters
             params = dict(result.requirements.params)
@@ -354,7 +368,7 @@ class OptimizedQueryAdapter:
                 cache_hit=False
             )
 
-@dataclass
+@dataclass(slots=True)
 class OptimizedPipelineResult:
     """Enhanced pipeline result with performance metrics"""
     success: bool
@@ -389,73 +403,38 @@ class OptimizedPipelineResult:
 class OptimizedResultAdapter:
     """Enhanced result adapter with performance optimizations"""
     
-    def __init__(self):
-        self.cache_manager = CacheManager()
-    
     async def adapt_pipeline_result(self, result: Any, start_time: float) -> OptimizedPipelineResult:
         """Convert pipeline result with performance metrics"""
         processing_time = datetime.now().timestamp() - start_time
         
+        # Pipeline responses are dicts; DataResponse-like objects carry the same fields
         if isinstance(result, dict):
-            # Handle dictionary response from pipeline
-            cache_key = CacheKey.from_query(
-                "pipeline_result",
-                {"data_hash": hashlib.sha256(str(result.get('data', {})).encode()).hexdigest()}
-            )
-            
-            # Check cache
-            if cached := await self.cache_manager.get(cache_key):
-                return cast(OptimizedPipelineResult, cached)
-            
-            # Create new result
-            pipeline_result = OptimizedPipelineResult(
-                success=result.get('success', False),
-                data=result.get('data'),
-                error=result.get('error'),
-                metadata={
-                    "source": "pipeline",
-                    "timestamp": datetime.now().isoformat(),
-                    "cache_key": cache_key,
-                    **result.get('metadata', {})
-                },
-                processing_time=processing_time,
-                cache_hit=False
-            )
-            
-            # Cache result
-            await self.cache_manager.set(cache_key, pipeline_result)
-            return pipeline_result
-            
+            success = result.get('success', False)
+            data = result.get('data')
+            error = result.get('error')
+            extra_metadata = result.get('metadata') or {}
         elif hasattr(result, 'success') and hasattr(result, 'data'):
-            # Handle object response
-            cache_key = CacheKey.from_query(
-                "pipeline_result",
-                {"data_hash": hashlib.sha256(str(result.data).encode()).hexdigest()}
-            )
-            
-            # Check cache
-            if cached := await self.cache_manager.get(cache_key):
-                return cast(OptimizedPipelineResult, cached)
-            
-            # Create new result
-            pipeline_result = OptimizedPipelineResult(
-                success=result.success,
-                data=result.data if result.success else None,
-                error=result.error if hasattr(result, "error") else None,
-                metadata={
-                    "source": "pipeline",
-                    "timestamp": datetime.now().isoformat(),
-                    "cache_key": cache_key
-                },
-                processing_time=processing_time,
-                cache_hit=False
-            )
-            
-            # Cache result
-            await self.cache_manager.set(cache_key, pipeline_result)
-            return pipeline_result
+            success = result.success
+            data = result.data if result.success else None
+            error = getattr(result, 'error', None)
+            extra_metadata = {}
         else:
             raise ValueError(f"Unsupported result type: {type(result)}")
+        
+        # Built directly: a cache keyed on the data would have to hash all of it
+        # just to return a wrapper around the same object
+        return OptimizedPipelineResult(
+            success=success,
+            data=data,
+            error=error,
+            metadata={
+                "source": "pipeline",
+                "timestamp": datetime.now().isoformat(),
+                **extra_metadata
+            },
+            processing_time=processing_time,
+            cache_hit=False
+        )
 
 class OptimizedValidationAdapter:
     """Enhanced validation with parallel processing"""
@@ -499,4 +478,67 @@ class OptimizedValidationAdapter:
             isinstance(result.metadata, dict),
             isinstance(result.processing_time, float),
             isinstance(result.cache_hit, bool)
-        ]) 
\ No newline at end of file
+        ]) 
+
+class ValidationBatcher:
+    """Coalesces single-result validations into batched validate_batch calls.
+    
+    Callers await validate() for one result; a background worker drains the
+    queue up to max_batch items (waiting at most max_wait seconds for a
+    batch to fill) and validates them with a single adapter call.
+    """
+    
+    def __init__(self, validation_adapter: OptimizedValidationAdapter, max_batch: int = 8, max_wait: float = 0.05):
+        self.validation_adapter = validation_adapter
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "asyncio.Queue[Tuple[Union[OptimizedQueryResult, OptimizedPipelineResult], asyncio.Future]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def __aenter__(self) -> "ValidationBatcher":
+        self._worker = asyncio.create_task(self._run())
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        if self._worker is not None:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+        # Fail anything still queued so no caller waits forever
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+    
+    async def validate(self, result: Union[OptimizedQueryResult, OptimizedPipelineResult]) -> bool:
+        """Queue a result for validation and wait for its verdict"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((result, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                verdicts = await self.validation_adapter.validate_batch([result for result, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), valid in zip(items, verdicts):
+                if not future.done():
+                    future.set_result(valid)
@@ -6,7 +6,6 @@ from pathlib import Path
 import pandas as pd
 import httpx
 import traceback
-from collections import defaultdict
 from typing import Union, Dict, Any, List, cast
 from datetime import datetime
 
@@ -26,12 +25,22 @@ from app.pipeline.optimized_adapters import (
 )
 
 class TestMetrics:
+    __slots__ = (
+        'query_to_json_success', 'query_to_json_failure',
+        'json_to_df_success', 'json_to_df_failure',
+        'failure_reasons',
+        'adapter_success', 'adapter_failure',
+        'validation_success', 'validation_failure',
+        'cache_hits', 'cache_misses',
+        'total_processing_time', 'query_count'
+    )
+    
     def __init__(self):
         self.query_to_json_success = 0
         self.query_to_json_failure = 0
         self.json_to_df_success = 0
         self.json_to_df_failure = 0
-        self.failure_reasons = defaultdict(int)
+        self.failure_reasons: Dict[str, int] = {}
         self.adapter_success = 0
         self.adapter_failure = 0
         self.validation_success = 0
@@ -45,33 +54,36 @@ class TestMetrics:
         """Calculate percentage safely handling zero division"""
         return (part / total * 100) if total > 0 else 0.0
     
+    def _record_failure_reason(self, reason: str):
+        self.failure_reasons[reason] = self.failure_reasons.get(reason, 0) + 1
+    
     def record_adapter_success(self):
         self.adapter_success += 1
     
     def record_adapter_failure(self, reason: str):
         self.adapter_failure += 1
-        self.failure_reasons[f"Adapter: {reason}"] += 1
+        self._record_failure_reason(f"Adapter: {reason}")
     
     def record_validation_success(self):
         self.validation_success += 1
     
     def record_validation_failure(self, reason: str):
         self.validation_failure += 1
-        self.failure_reasons[f"Validation: {reason}"] += 1
+        self._record_failure_reason(f"Validation: {reason}")
     
     def record_api_success(self):
         self.query_to_json_success += 1
     
     def record_api_failure(self, reason: str):
         self.query_to_json_failure += 1
-        self.failure_reasons[f"API: {reason}"] += 1
+        self._record_failure_reason(f"API: {reason}")
     
     def record_df_success(self):
         self.json_to_df_success += 1
     
     def record_df_failure(self, reason: str):
         self.json_to_df_failure += 1
-        self.failure_reasons[f"DataFrame: {reason}"] += 1
+        self._record_failure_reason(f"DataFrame: {reason}")
     
     def record_cache_hit(self):
         self.cache_hits += 1
@@ -197,8 +209,8 @@ async def test_integrated_pipeline(query: str, client: httpx.AsyncClient) -> Uni
         # Return the processed data
         if pipeline_result.success and pipeline_result.data is not None:
             metrics.record_api_success()
-            df = pipeline_result.data.get("results", pd.DataFrame())
-            if not df.empty:
+            df = pipeline_result.data.get("results")
+            if df is not None and len(df.index) > 0:
                 metrics.record_df_success()
                 return df
             else:
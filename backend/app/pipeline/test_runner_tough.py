@@ -1,335 +1,476 @@
 """Test runner for challenging historical and ambiguous queries"""
 
 import asyncio
+import hashlib
+import io
+import logging
+import os
+import pickle
+import re
 import sys
+import time
 from pathlib import Path
-import pandas as pd
 import httpx
+import orjson
 import traceback
-from collections import defaultdict
-from typing import Union, Dict, Any, List, cast
-from datetime import datetime
+from collections import Counter
+from contextlib import suppress
+from operator import itemgetter
+from typing import TYPE_CHECKING, Union, Dict, Any, List, Optional, Sequence, Tuple, cast
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Add the backend directory to Python path
 backend_dir = str(Path(__file__).parent.parent.parent)
 if backend_dir not in sys.path:
     sys.path.append(backend_dir)
 
+from app.api.f1_api import ERGAST_BASE_URL
 from app.pipeline.data2 import DataPipeline
+from app.query.models import ProcessingResult
 from app.query.processor import QueryProcessor
 from app.pipeline.optimized_adapters import (
     OptimizedQueryAdapter,
     OptimizedResultAdapter,
     OptimizedValidationAdapter,
+    ValidationBatcher,
     OptimizedQueryResult,
     OptimizedPipelineResult
 )
 
+CACHE_DIR = Path(__file__).parent / ".cache"
+# Bump whenever the shape of CachedStages changes
+CACHE_SCHEMA_VERSION = 1
+# Persisted stage results older than this are recomputed
+CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 24 * 60 * 60))
+# Historical queries fan out into one fetch per season, so the pool is sized
+# well above the number of concurrent queries
+MAX_CONCURRENT_QUERIES = 8
+# Wall-clock budget for a single query, below the 30s client timeout
+QUERY_TIMEOUT = 25.0
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+# Cheap request used to open a connection before the first query
+WARMUP_URL = f"{ERGAST_BASE_URL}/seasons.json"
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+# Per-step progress output is only written at LOG_LEVEL=DEBUG
+LOG_LEVEL = logging.getLevelName(os.environ.get("LOG_LEVEL", "INFO").upper())
+VERBOSE = LOG_LEVEL == logging.DEBUG
+# Full tracebacks are only formatted when PIPELINE_DEBUG is set
+PIPELINE_DEBUG = bool(os.environ.get("PIPELINE_DEBUG"))
+
+# Historical queries
+HISTORICAL_QUERIES: Tuple[str, ...] = (
+    "How has Mercedes' win rate changed since 2010?",
+    "Which driver has won the most races in wet conditions since 2005?",
+    "What are Red Bull's podium finishes by year from 2015 to 2023?",
+    "How many races has Hamilton won each season since 2014?",
+    "Which team dominated constructors' championships from 2000 to 2010?",
+    "Show the fastest lap times in Monaco for each season since 2010.",
+    "How many DNFs has Ferrari had in the last 5 seasons?",
+    "What is the historical trend for fastest laps set by Verstappen since his debut?",
+    "How many pole positions did Red Bull achieve during the Vettel era (2010-2013)?",
+    "Which driver has the most points without winning a championship since 1990?",
+)
+
+# Ambiguous queries
+AMBIGUOUS_QUERIES: Tuple[str, ...] = (
+    "Which driver performs best in the rain?",
+    "Who is the fastest driver in Monaco?",
+    "What team has improved the most over the last 5 seasons?",
+    "Which constructor is the best on street circuits?",
+    "What is Hamilton's success rate at circuits where Verstappen also won?",
+    "Which races had the closest finishes in F1 history?",
+    "How does Ferrari perform compared to Red Bull in wet conditions?",
+    "What is the average finishing position for Alonso in 2023?",
+    "Which races had safety cars deployed in 2022?",
+    "Who are the best drivers on tire conservation strategies?",
+)
+
+# (query result, raw pipeline response, adapted pipeline result)
+CachedStages = Tuple[ProcessingResult, Dict[str, Any], OptimizedPipelineResult]
+
+# Metric category -> prefix used for its failure reasons
+FAILURE_PREFIXES = {
+    "historical": "Historical",
+    "ambiguous": "Ambiguous",
+    "entity_resolution": "Entity Resolution",
+    "adapter": "Adapter",
+    "validation": "Validation",
+    "api": "API",
+    "df": "DataFrame",
+    "cache": "Cache"
+}
+
+# Metric event: (category, success, failure reason), or processing time
+MetricEvent = Tuple[str, Union[bool, float], str]
+_PROCESSING_TIME = "processing_time"
+
+# (title, category, success label, failure label) in summary order
+SUMMARY_SECTIONS = (
+    ("Historical Query Performance", "historical", "Success", "Failure"),
+    ("Ambiguous Query Performance", "ambiguous", "Success", "Failure"),
+    ("Entity Resolution Performance", "entity_resolution", "Success", "Failure"),
+    ("Adapter Performance", "adapter", "Success", "Failure"),
+    ("Validation Performance", "validation", "Success", "Failure"),
+    ("Cache Performance", "cache", "Hits", "Misses"),
+    ("Query → JSON (API Fetch)", "api", "Success", "Failure"),
+    ("JSON → DataFrame", "df", "Success", "Failure"),
+)
+
 class TestMetrics:
+    """Run metrics; updates are queued and applied by a single consumer task"""
+    __slots__ = ('_counters', 'failure_reasons', 'total_processing_time', 'query_count', '_events', '_consumer')
+    
     def __init__(self):
-        self.query_to_json_success = 0
-        self.query_to_json_failure = 0
-        self.json_to_df_success = 0
-        self.json_to_df_failure = 0
-        self.failure_reasons = defaultdict(int)
-        self.adapter_success = 0
-        self.adapter_failure = 0
-        self.validation_success = 0
-        self.validation_failure = 0
-        self.cache_hits = 0
-        self.cache_misses = 0
+        # (category, success) -> count, preallocated for every category
+        self._counters: Dict[Tuple[str, bool], int] = {
+            (category, success): 0
+            for category in FAILURE_PREFIXES
+            for success in (True, False)
+        }
+        self.failure_reasons: Counter = Counter()
         self.total_processing_time = 0.0
         self.query_count = 0
-        # New metrics for tough queries
-        self.historical_success = 0
-        self.historical_failure = 0
-        self.ambiguous_success = 0
-        self.ambiguous_failure = 0
-        self.entity_resolution_success = 0
-        self.entity_resolution_failure = 0
+        self._events: "asyncio.Queue[MetricEvent]" = asyncio.Queue()
+        self._consumer: Optional[asyncio.Task] = None
     
-    def _safe_percentage(self, part: int, total: int) -> float:
-        """Calculate percentage safely handling zero division"""
-        return (part / total * 100) if total > 0 else 0.0
+    def record(self, category: str, success: bool, reason: str = ""):
+        """Record a success or failure for a metric category (cache: hit/miss)"""
+        self._events.put_nowait((category, success, reason))
     
-    def record_historical_success(self):
-        self.historical_success += 1
+    def record_processing_time(self, time: float):
+        self._events.put_nowait((_PROCESSING_TIME, time, ""))
     
-    def record_historical_failure(self, reason: str):
-        self.historical_failure += 1
-        self.failure_reasons[f"Historical: {reason}"] += 1
+    def _apply(self, category: str, value: Union[bool, float], reason: str):
+        """Apply a single queued event; only called from the consumer"""
+        if category == _PROCESSING_TIME:
+            self.total_processing_time += value
+            self.query_count += 1
+            return
+        self._counters[category, value] += 1
+        if not value and reason:
+            self.failure_reasons[f"{FAILURE_PREFIXES[category]}: {reason}"] += 1
     
-    def record_ambiguous_success(self):
-        self.ambiguous_success += 1
+    async def _consume(self):
+        while True:
+            event = await self._events.get()
+            self._apply(*event)
+            self._events.task_done()
     
-    def record_ambiguous_failure(self, reason: str):
-        self.ambiguous_failure += 1
-        self.failure_reasons[f"Ambiguous: {reason}"] += 1
+    def start(self):
+        """Start the consumer task on the running loop"""
+        if self._consumer is None:
+            self._consumer = asyncio.create_task(self._consume())
     
-    def record_entity_resolution_success(self):
-        self.entity_resolution_success += 1
+    async def drain(self):
+        """Wait for all queued events to be applied, then stop the consumer"""
+        await self._events.join()
+        if self._consumer is not None:
+            self._consumer.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._consumer
+            self._consumer = None
     
-    def record_entity_resolution_failure(self, reason: str):
-        self.entity_resolution_failure += 1
-        self.failure_reasons[f"Entity Resolution: {reason}"] += 1
+    def print_summary(self):
+        c = self._counters
+        avg_processing_time = self.total_processing_time / self.query_count if self.query_count > 0 else 0
+        
+        lines = ["", "=== Tough Query Test Metrics Summary ==="]
+        for title, category, success_label, failure_label in SUMMARY_SECTIONS:
+            succeeded, failed = c[category, True], c[category, False]
+            total = succeeded + failed
+            success_pct = succeeded * 100.0 / total if total else 0.0
+            failure_pct = failed * 100.0 / total if total else 0.0
+            lines.append("")
+            lines.append(f"{title}:")
+            lines.append(f"  {success_label}: {succeeded}/{total} ({success_pct:.1f}%)")
+            lines.append(f"  {failure_label}: {failed}/{total} ({failure_pct:.1f}%)")
+        
+        lines.append("")
+        lines.append("Performance Metrics:")
+        lines.append(f"  Average Processing Time: {avg_processing_time:.2f} seconds")
+        lines.append(f"  Total Queries Processed: {self.query_count}")
+        
+        if self.failure_reasons:
+            lines.append("")
+            lines.append("Failure Reasons:")
+            reasons = sorted(self.failure_reasons.items(), key=itemgetter(1), reverse=True)
+            lines.extend(f"  {reason}: {count}" for reason, count in reasons)
+        
+        sys.stdout.write("\n".join(lines) + "\n")
+
+metrics = TestMetrics()
+
+def normalize_query(query: str) -> str:
+    """Normalize query text by lowercasing, stripping punctuation and collapsing whitespace"""
+    return " ".join(_PUNCTUATION_RE.sub(" ", query.lower()).split())
+
+def _schema_tag() -> str:
+    """Schema version plus a hash of the code producing the cached stages"""
+    digest = hashlib.sha256(str(CACHE_SCHEMA_VERSION).encode())
+    for module in (DataPipeline, QueryProcessor, ProcessingResult, OptimizedQueryAdapter):
+        digest.update(Path(sys.modules[module.__module__].__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+class QueryResultCache:
+    """Stage cache mapping normalized query text to its pipeline results.
     
-    def record_adapter_success(self):
-        self.adapter_success += 1
+    Entries are persisted to disk in a file keyed by a hash of the pipeline
+    configuration, so reruns with the same configuration skip network I/O.
+    Each entry carries the schema tag and time it was stored; entries from
+    other pipeline code or older than CACHE_TTL are dropped.
+    """
     
-    def record_adapter_failure(self, reason: str):
-        self.adapter_failure += 1
-        self.failure_reasons[f"Adapter: {reason}"] += 1
+    def __init__(self, config: Dict[str, Any]):
+        config_hash = hashlib.sha256(orjson.dumps(config, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+        self.path = CACHE_DIR / f"query_cache_{config_hash}.pkl"
+        self.schema = _schema_tag()
+        self.entries: Dict[str, Tuple[str, float, CachedStages]] = {}
+        self._lock = asyncio.Lock()
     
-    def record_validation_success(self):
-        self.validation_success += 1
+    @staticmethod
+    def make_key(query: str) -> str:
+        return hashlib.sha256(normalize_query(query).encode()).hexdigest()
     
-    def record_validation_failure(self, reason: str):
-        self.validation_failure += 1
-        self.failure_reasons[f"Validation: {reason}"] += 1
+    def _is_fresh(self, entry: Tuple[str, float, CachedStages]) -> bool:
+        schema, created, _ = entry
+        return schema == self.schema and time.time() - created < CACHE_TTL
     
-    def record_api_success(self):
-        self.query_to_json_success += 1
+    async def get(self, query: str) -> Optional[CachedStages]:
+        async with self._lock:
+            entry = self.entries.get(self.make_key(query))
+            return entry[2] if entry is not None and self._is_fresh(entry) else None
     
-    def record_api_failure(self, reason: str):
-        self.query_to_json_failure += 1
-        self.failure_reasons[f"API: {reason}"] += 1
+    async def set(self, query: str, stages: CachedStages):
+        async with self._lock:
+            self.entries[self.make_key(query)] = (self.schema, time.time(), stages)
     
-    def record_df_success(self):
-        self.json_to_df_success += 1
+    def load(self):
+        """Load fresh persisted entries, discarding missing, unreadable or outdated cache files"""
+        try:
+            with open(self.path, 'rb') as f:
+                stored = pickle.load(f)
+            self.entries.update(
+                (key, entry) for key, entry in stored.items()
+                if isinstance(entry, tuple) and len(entry) == 3 and self._is_fresh(entry)
+            )
+        except Exception:
+            # Any pickle from older code (renamed classes, other layouts) is just a miss
+            pass
     
-    def record_df_failure(self, reason: str):
-        self.json_to_df_failure += 1
-        self.failure_reasons[f"DataFrame: {reason}"] += 1
+    def save(self):
+        """Persist all entries to disk"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'wb') as f:
+            pickle.dump(self.entries, f)
+
+def _step(out: io.StringIO, message: str) -> None:
+    """Buffer a progress line when running verbosely"""
+    if VERBOSE:
+        out.write(message + "\n")
+
+async def _run_pipeline_stages(
+    query: str,
+    start_time: float,
+    out: io.StringIO,
+    *,
+    processor: QueryProcessor,
+    query_adapter: OptimizedQueryAdapter,
+    validator: ValidationBatcher,
+    result_adapter: OptimizedResultAdapter,
+    pipeline: DataPipeline
+) -> Optional[CachedStages]:
+    """Run query processing, adaptation and pipeline stages; None if adaptation fails"""
+    # Step 1: Process query
+    _step(out, "\nStep 1: Processing query...")
+    query_result = await processor.process_query(query)
     
-    def record_cache_hit(self):
-        self.cache_hits += 1
+    # Step 2: Adapt query result with optimized adapter
+    _step(out, "\nStep 2: Adapting query result...")
+    try:
+        adapted_result = await query_adapter.adapt(query_result)
+        if await validator.validate(adapted_result):
+            metrics.record("adapter", True)
+            metrics.record("validation", True)
+            if adapted_result.cache_hit:
+                metrics.record("cache", True)
+            else:
+                metrics.record("cache", False)
+        else:
+            metrics.record("validation", False, "Invalid adapted result")
+            return None
+    except Exception as e:
+        metrics.record("adapter", False, str(e))
+        out.write(f"Adapter error: {str(e)}\n")
+        return None
     
-    def record_cache_miss(self):
-        self.cache_misses += 1
+    # Step 3: Convert to pipeline format
+    _step(out, "\nStep 3: Converting to pipeline format...")
+    requirements = query_adapter.cached_to_data_requirements(adapted_result)
     
-    def record_processing_time(self, time: float):
-        self.total_processing_time += time
-        self.query_count += 1
+    # Step 4: Process in pipeline
+    _step(out, "\nStep 4: Processing in pipeline...")
+    response = await pipeline.process(requirements)
     
-    def print_summary(self):
-        total_api = self.query_to_json_success + self.query_to_json_failure
-        total_df = self.json_to_df_success + self.json_to_df_failure
-        total_adapter = self.adapter_success + self.adapter_failure
-        total_validation = self.validation_success + self.validation_failure
-        total_cache = self.cache_hits + self.cache_misses
-        total_historical = self.historical_success + self.historical_failure
-        total_ambiguous = self.ambiguous_success + self.ambiguous_failure
-        total_entity = self.entity_resolution_success + self.entity_resolution_failure
-        avg_processing_time = self.total_processing_time / self.query_count if self.query_count > 0 else 0
-        
-        print("\n=== Tough Query Test Metrics Summary ===")
-        
-        print(f"\nHistorical Query Performance:")
-        print(f"  Success: {self.historical_success}/{total_historical} ({self._safe_percentage(self.historical_success, total_historical):.1f}%)")
-        print(f"  Failure: {self.historical_failure}/{total_historical} ({self._safe_percentage(self.historical_failure, total_historical):.1f}%)")
-        
-        print(f"\nAmbiguous Query Performance:")
-        print(f"  Success: {self.ambiguous_success}/{total_ambiguous} ({self._safe_percentage(self.ambiguous_success, total_ambiguous):.1f}%)")
-        print(f"  Failure: {self.ambiguous_failure}/{total_ambiguous} ({self._safe_percentage(self.ambiguous_failure, total_ambiguous):.1f}%)")
-        
-        print(f"\nEntity Resolution Performance:")
-        print(f"  Success: {self.entity_resolution_success}/{total_entity} ({self._safe_percentage(self.entity_resolution_success, total_entity):.1f}%)")
-        print(f"  Failure: {self.entity_resolution_failure}/{total_entity} ({self._safe_percentage(self.entity_resolution_failure, total_entity):.1f}%)")
-        
-        print(f"\nAdapter Performance:")
-        print(f"  Success: {self.adapter_success}/{total_adapter} ({self._safe_percentage(self.adapter_success, total_adapter):.1f}%)")
-        print(f"  Failure: {self.adapter_failure}/{total_adapter} ({self._safe_percentage(self.adapter_failure, total_adapter):.1f}%)")
-        
-        print(f"\nValidation Performance:")
-        print(f"  Success: {self.validation_success}/{total_validation} ({self._safe_percentage(self.validation_success, total_validation):.1f}%)")
-        print(f"  Failure: {self.validation_failure}/{total_validation} ({self._safe_percentage(self.validation_failure, total_validation):.1f}%)")
-        
-        print(f"\nCache Performance:")
-        print(f"  Hits: {self.cache_hits}/{total_cache} ({self._safe_percentage(self.cache_hits, total_cache):.1f}%)")
-        print(f"  Misses: {self.cache_misses}/{total_cache} ({self._safe_percentage(self.cache_misses, total_cache):.1f}%)")
-        
-        print(f"\nQuery → JSON (API Fetch):")
-        print(f"  Success: {self.query_to_json_success}/{total_api} ({self._safe_percentage(self.query_to_json_success, total_api):.1f}%)")
-        print(f"  Failure: {self.query_to_json_failure}/{total_api} ({self._safe_percentage(self.query_to_json_failure, total_api):.1f}%)")
-        
-        print(f"\nJSON → DataFrame:")
-        print(f"  Success: {self.json_to_df_success}/{total_df} ({self._safe_percentage(self.json_to_df_success, total_df):.1f}%)")
-        print(f"  Failure: {self.json_to_df_failure}/{total_df} ({self._safe_percentage(self.json_to_df_failure, total_df):.1f}%)")
-        
-        print(f"\nPerformance Metrics:")
-        print(f"  Average Processing Time: {avg_processing_time:.2f} seconds")
-        print(f"  Total Queries Processed: {self.query_count}")
-        
-        if self.failure_reasons:
-            print("\nFailure Reasons:")
-            for reason, count in sorted(self.failure_reasons.items(), key=lambda x: x[1], reverse=True):
-                print(f"  {reason}: {count}")
-
-metrics = TestMetrics()
+    # Step 5: Adapt pipeline result with optimized adapter
+    _step(out, "\nStep 5: Adapting pipeline result...")
+    try:
+        pipeline_result = await result_adapter.adapt_pipeline_result(response, start_time)
+        if await validator.validate(pipeline_result):
+            metrics.record("validation", True)
+            if pipeline_result.cache_hit:
+                metrics.record("cache", True)
+            else:
+                metrics.record("cache", False)
+        else:
+            metrics.record("validation", False, "Invalid pipeline result")
+            return None
+    except Exception as e:
+        metrics.record("adapter", False, str(e))
+        out.write(f"Pipeline result adapter error: {str(e)}\n")
+        return None
+    
+    return query_result, response, pipeline_result
 
-async def test_integrated_pipeline(query: str, query_type: str, client: httpx.AsyncClient) -> Union[pd.DataFrame, Dict[str, Any]]:
-    """Test the integrated pipeline with optimized adapters."""
-    print(f"\nTesting {query_type} query: {query}")
+async def test_integrated_pipeline(
+    query: str,
+    query_type: str,
+    client: httpx.AsyncClient,
+    *,
+    query_cache: QueryResultCache,
+    **components: Any
+) -> Optional["pd.DataFrame"]:
+    """Test the integrated pipeline with optimized adapters.
+    
+    The processor, adapters and pipeline in ``components`` are shared across
+    queries so their internal caches stay warm for the whole run. Queries
+    already present in ``query_cache`` skip the network-bound stages.
+    Returns None when any stage fails or no rows come back.
+    """
+    out = io.StringIO()
+    out.write(f"\nTesting {query_type} query: {query}\n")
     
-    start_time = datetime.now().timestamp()
+    start_time = time.perf_counter()
+    # adapt_pipeline_result measures against wall-clock time
+    wall_start = time.time()
     
     try:
-        # Step 1: Process query
-        print("\nStep 1: Processing query...")
-        processor = QueryProcessor()
-        query_result = await processor.process_query(query)
-        
-        # Step 2: Adapt query result with optimized adapter
-        print("\nStep 2: Adapting query result...")
-        query_adapter = OptimizedQueryAdapter()
-        validation_adapter = OptimizedValidationAdapter()
-        
-        try:
-            adapted_result = await query_adapter.adapt(query_result)
-            validation_results = await validation_adapter.validate_batch([adapted_result])
-            if validation_results and validation_results[0]:
-                metrics.record_adapter_success()
-                metrics.record_validation_success()
-                if adapted_result.cache_hit:
-                    metrics.record_cache_hit()
-                else:
-                    metrics.record_cache_miss()
-            else:
-                metrics.record_validation_failure("Invalid adapted result")
-                return pd.DataFrame()
-        except Exception as e:
-            metrics.record_adapter_failure(str(e))
-            print(f"Adapter error: {str(e)}")
-            return pd.DataFrame()
-        
-        # Step 3: Convert to pipeline format
-        print("\nStep 3: Converting to pipeline format...")
-        requirements = adapted_result.to_data_requirements()
-        
-        # Step 4: Process in pipeline
-        print("\nStep 4: Processing in pipeline...")
-        pipeline = DataPipeline()
-        response = await pipeline.process(requirements)
-        
-        # Step 5: Adapt pipeline result with optimized adapter
-        print("\nStep 5: Adapting pipeline result...")
-        result_adapter = OptimizedResultAdapter()
-        
-        try:
-            pipeline_result = await result_adapter.adapt_pipeline_result(response, start_time)
-            validation_results = await validation_adapter.validate_batch([pipeline_result])
-            if validation_results and validation_results[0]:
-                metrics.record_validation_success()
-                if pipeline_result.cache_hit:
-                    metrics.record_cache_hit()
-                else:
-                    metrics.record_cache_miss()
-            else:
-                metrics.record_validation_failure("Invalid pipeline result")
-                return pd.DataFrame()
-        except Exception as e:
-            metrics.record_adapter_failure(str(e))
-            print(f"Pipeline result adapter error: {str(e)}")
-            return pd.DataFrame()
+        cached = await query_cache.get(query)
+        if cached is not None:
+            _step(out, "\nQuery cache hit, skipping pipeline stages...")
+            metrics.record("cache", True)
+            pipeline_result = cached[2]
+        else:
+            stages = await _run_pipeline_stages(query, wall_start, out, **components)
+            if stages is None:
+                return None
+            pipeline_result = stages[2]
+            if pipeline_result.success:
+                await query_cache.set(query, stages)
         
         # Record processing time
-        processing_time = datetime.now().timestamp() - start_time
+        processing_time = time.perf_counter() - start_time
         metrics.record_processing_time(processing_time)
         
         # Record query type specific metrics
-        if query_type == "historical":
-            if pipeline_result.success:
-                metrics.record_historical_success()
-            else:
-                metrics.record_historical_failure(pipeline_result.error or "Unknown error")
-        elif query_type == "ambiguous":
-            if pipeline_result.success:
-                metrics.record_ambiguous_success()
-            else:
-                metrics.record_ambiguous_failure(pipeline_result.error or "Unknown error")
+        if query_type in ("historical", "ambiguous"):
+            metrics.record(query_type, pipeline_result.success, pipeline_result.error or "Unknown error")
         
         # Record entity resolution if applicable
         if "entities" in pipeline_result.metadata:
-            if pipeline_result.success:
-                metrics.record_entity_resolution_success()
-            else:
-                metrics.record_entity_resolution_failure(pipeline_result.error or "Unknown error")
+            metrics.record("entity_resolution", pipeline_result.success, pipeline_result.error or "Unknown error")
         
         # Return the processed data
         if pipeline_result.success and pipeline_result.data is not None:
-            metrics.record_api_success()
-            df = pipeline_result.data.get("results", pd.DataFrame())
-            if not df.empty:
-                metrics.record_df_success()
+            metrics.record("api", True)
+            df = pipeline_result.data.get("results")
+            if df is not None and len(df.index) > 0:
+                metrics.record("df", True)
                 return df
             else:
-                metrics.record_df_failure("Empty DataFrame")
+                metrics.record("df", False, "Empty DataFrame")
         else:
-            metrics.record_api_failure(pipeline_result.error or "Unknown error")
+            metrics.record("api", False, pipeline_result.error or "Unknown error")
         
-        return pd.DataFrame()
+        return None
         
     except Exception as e:
-        print(f"Error: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
-        return pd.DataFrame()
+        out.write(f"Error: {type(e).__name__}: {str(e)}\n")
+        if PIPELINE_DEBUG:
+            out.write(f"Traceback: {traceback.format_exc()}\n")
+        return None
+    finally:
+        # One write per query keeps concurrent output from interleaving
+        sys.stdout.write(out.getvalue())
+
+async def warm_up(client: httpx.AsyncClient) -> None:
+    """Open a pooled connection to the API before the run; errors are ignored"""
+    try:
+        await client.get(WARMUP_URL, params={"limit": 1})
+    except httpx.HTTPError as e:
+        print(f"Warmup request failed: {str(e)}")
 
-async def run_all_tests(historical_queries: List[str], ambiguous_queries: List[str]):
+async def run_all_tests(historical_queries: Sequence[str], ambiguous_queries: Sequence[str]):
     """Run all tests using a single event loop and shared client"""
     print("Starting test of tough queries...")
     print(f"Total historical queries: {len(historical_queries)}")
     print(f"Total ambiguous queries: {len(ambiguous_queries)}")
     print("-" * 80)
     
+    # Shared components, constructed once and reused for every query
+    processor = QueryProcessor()
+    query_adapter = OptimizedQueryAdapter()
+    validation_adapter = OptimizedValidationAdapter()
+    result_adapter = OptimizedResultAdapter()
+    query_cache = QueryResultCache({
+        "model": "gpt-4o-mini",
+        "ergast_base_url": ERGAST_BASE_URL
+    })
+    query_cache.load()
+    metrics.start()
+    
     timeout = httpx.Timeout(30.0)
-    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-        # Process historical queries in parallel batches
-        batch_size = 4
-        for i in range(0, len(historical_queries), batch_size):
-            batch = historical_queries[i:i + batch_size]
-            print(f"\nProcessing historical batch {i//batch_size + 1}/{(len(historical_queries) + batch_size - 1)//batch_size}")
-            tasks = [test_integrated_pipeline(query, "historical", client) for query in batch]
-            await asyncio.gather(*tasks)
-            print("-" * 80)
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, limits=HTTP_LIMITS) as client, \
+            ValidationBatcher(validation_adapter) as validator:
+        # The pipeline reuses the shared client's connection pool
+        pipeline = DataPipeline(client=client)
+        await warm_up(client)
+        components = {
+            "processor": processor,
+            "query_adapter": query_adapter,
+            "validator": validator,
+            "result_adapter": result_adapter,
+            "pipeline": pipeline,
+            "query_cache": query_cache
+        }
+        
+        # Run every query concurrently, bounded by a semaphore rather than
+        # fixed batches so one slow query does not hold back the rest, and
+        # by a per-query timeout so a stuck query cannot pin the run
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+        
+        async def bounded(query: str, query_type: str):
+            async with semaphore:
+                try:
+                    async with asyncio.timeout(QUERY_TIMEOUT):
+                        return await test_integrated_pipeline(query, query_type, client, **components)
+                except TimeoutError:
+                    print(f"\nTimed out after {QUERY_TIMEOUT:.0f}s: {query}")
+                    metrics.record(query_type, False, f"Timed out after {QUERY_TIMEOUT:.0f}s")
+                    return None
         
-        # Process ambiguous queries in parallel batches
-        for i in range(0, len(ambiguous_queries), batch_size):
-            batch = ambiguous_queries[i:i + batch_size]
-            print(f"\nProcessing ambiguous batch {i//batch_size + 1}/{(len(ambiguous_queries) + batch_size - 1)//batch_size}")
-            tasks = [test_integrated_pipeline(query, "ambiguous", client) for query in batch]
-            await asyncio.gather(*tasks)
-            print("-" * 80)
+        async with asyncio.TaskGroup() as tg:
+            for query in historical_queries:
+                tg.create_task(bounded(query, "historical"))
+            for query in ambiguous_queries:
+                tg.create_task(bounded(query, "ambiguous"))
+        print("-" * 80)
     
+    query_cache.save()
+    await metrics.drain()
     metrics.print_summary()
 
 if __name__ == "__main__":
-    # Historical queries
-    historical_queries = [
-        "How has Mercedes' win rate changed since 2010?",
-        "Which driver has won the most races in wet conditions since 2005?",
-        "What are Red Bull's podium finishes by year from 2015 to 2023?",
-        "How many races has Hamilton won each season since 2014?",
-        "Which team dominated constructors' championships from 2000 to 2010?",
-        "Show the fastest lap times in Monaco for each season since 2010.",
-        "How many DNFs has Ferrari had in the last 5 seasons?",
-        "What is the historical trend for fastest laps set by Verstappen since his debut?",
-        "How many pole positions did Red Bull achieve during the Vettel era (2010-2013)?",
-        "Which driver has the most points without winning a championship since 1990?"
-    ]
-    
-    # Ambiguous queries
-    ambiguous_queries = [
-        "Which driver performs best in the rain?",
-        "Who is the fastest driver in Monaco?",
-        "What team has improved the most over the last 5 seasons?",
-        "Which constructor is the best on street circuits?",
-        "What is Hamilton's success rate at circuits where Verstappen also won?",
-        "Which races had the closest finishes in F1 history?",
-        "How does Ferrari perform compared to Red Bull in wet conditions?",
-        "What is the average finishing position for Alonso in 2023?",
-        "Which races had safety cars deployed in 2022?",
-        "Who are the best drivers on tire conservation strategies?"
-    ]
-    
     # Run all tests in a single event loop with parallel processing
-    asyncio.run(run_all_tests(historical_queries, ambiguous_queries)) 
\ No newline at end of file
+    asyncio.run(run_all_tests(HISTORICAL_QUERIES, AMBIGUOUS_QUERIES))
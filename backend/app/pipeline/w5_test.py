@@ -19,6 +19,9 @@ from pipeline.data2 import DataPipeline, DataTransformer, DataResponse
 from query.processor import QueryProcessor
 from analyst.generate import generate_code, extract_code_block, execute_code_safely
 
+# Per-step progress output is only printed at LOG_LEVEL=DEBUG
+VERBOSE = os.environ.get("LOG_LEVEL", "INFO").upper() == "DEBUG"
+
 @pytest.fixture
 def test_suite():
     return W5TestSuite()
@@ -39,12 +42,15 @@ class W5TestSuite:
         print(f"\nTesting query: {query}")
         try:
             # 1. Process query
-            print("Step 1: Processing query...")
+            if VERBOSE:
+                print("Step 1: Processing query...")
             requirements = await self.query_processor.process_query(query)
-            print(f"Generated requirements: {requirements}")
+            if VERBOSE:
+                print(f"Generated requirements: {requirements}")
 
             # 2. Fetch and transform data
-            print("\nStep 2: Fetching and processing data...")
+            if VERBOSE:
+                print("\nStep 2: Fetching and processing data...")
             async with httpx.AsyncClient() as client:
                 self.pipeline.client = client
                 response: DataResponse = await self.pipeline.process(requirements)
@@ -53,16 +59,19 @@ class W5TestSuite:
                 data = response.data
             
             # 3. Generate analysis code
-            print("\nStep 3: Generating analysis code...")
+            if VERBOSE:
+                print("\nStep 3: Generating analysis code...")
             df = next(iter(data.values()))  # Get first DataFrame
             code_response = generate_code(df, query)
             code_block = extract_code_block(code_response)
             if not code_block:
                 raise Exception("No code block generated")
-            print(f"Generated code length: {len(code_block)}")
+            if VERBOSE:
+                print(f"Generated code length: {len(code_block)}")
 
             # 4. Execute code
-            print("\nStep 4: Executing analysis code...")
+            if VERBOSE:
+                print("\nStep 4: Executing analysis code...")
             success, result, _ = execute_code_safely(code_block, df)
             if not success:
                 raise Exception(f"Code execution failed: {result}")
@@ -1,7 +1,13 @@
-import http.client
-import json
-from typing import Dict, Any, Optional
-import time
+import asyncio
+import binascii
+import io
+import re
+from collections import Counter
+from contextlib import suppress
+from typing import Dict, Any, List, Optional
+import aiohttp
+import matplotlib.pyplot as plt
+import orjson
 import pandas as pd
 import sys
 import os
@@ -16,59 +22,108 @@ LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.a
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
-def log_generated_code(query: str, code: Optional[str], success: bool):
+# Generated code is appended here as one JSON record per line
+CODE_LOG_FILE = os.path.join(LOG_DIR, "generated_code.jsonl")
+
+def log_generated_code(code_log: "asyncio.Queue[bytes]", query: str, code: Optional[str], success: bool):
     """
-    Log generated code to a file
+    Queue generated code for the background log writer
     
     Args:
+        code_log: Queue drained by the log writer
         query: The original query
         code: The generated code (or error message if None)
         success: Whether the code generation was successful
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    status = "success" if success else "failed"
-    filename = f"generated_code_{timestamp}_{status}.py"
-    
-    with open(os.path.join(LOG_DIR, filename), 'w') as f:
-        f.write(f"# Query: {query}\n")
-        f.write(f"# Generated at: {datetime.now().isoformat()}\n")
-        f.write(f"# Status: {status}\n\n")
-        f.write(code if code is not None else "# No code was generated")
-    
-    print(f"\nLogged generated code to: {filename}")
+    code_log.put_nowait(orjson.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "query": query,
+        "status": "success" if success else "failed",
+        "code": code
+    }) + b"\n")
+
+def _append_code_log(lines: List[bytes]):
+    with open(CODE_LOG_FILE, 'ab') as f:
+        f.writelines(lines)
+
+async def _code_log_writer(code_log: "asyncio.Queue[bytes]"):
+    """Drain queued records and append each batch with a single write"""
+    while True:
+        lines = [await code_log.get()]
+        while not code_log.empty():
+            lines.append(code_log.get_nowait())
+        try:
+            await asyncio.to_thread(_append_code_log, lines)
+        except OSError as e:
+            print(f"Error writing code log: {str(e)}")
+        finally:
+            for _ in lines:
+                code_log.task_done()
 
 # Add the parent directory to sys.path to import from analyst
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from analyst.generate import generate_code, execute_code_safely, extract_code_block
 
-def fetch_f1_data(endpoint: str) -> Optional[Dict[Any, Any]]:
+ERGAST_HOST = "http://ergast.com"
+HEADERS = {
+    'User-Agent': 'F1-Analytics/1.0',
+    'Accept': 'application/json'
+}
+# Delay between API requests to respect rate limiting
+RATE_LIMIT_DELAY = 0.25
+
+async def fetch_f1_data(session: aiohttp.ClientSession, endpoint: str) -> Optional[bytes]:
     """
-    Fetch data from Ergast F1 API
+    Fetch the raw response body from Ergast F1 API
     Returns None if the request fails
     """
-    conn = http.client.HTTPConnection("ergast.com")
-    headers = {
-        'User-Agent': 'F1-Analytics/1.0',
-        'Accept': 'application/json'
-    }
-    
     try:
         print(f"\nFetching data from: {endpoint}")
-        conn.request("GET", endpoint, '', headers)
-        res = conn.getresponse()
-        
-        if res.status == 200:
-            data = res.read()
-            return json.loads(data.decode("utf-8"))
-        else:
-            print(f"Error: Status code {res.status}")
-            return None
+        async with session.get(f"{ERGAST_HOST}{endpoint}") as res:
+            if res.status == 200:
+                return await res.read()
+            else:
+                print(f"Error: Status code {res.status}")
+                return None
             
     except Exception as e:
         print(f"Error fetching data: {str(e)}")
         return None
-    finally:
-        conn.close()
+
+# Race fields carried onto each flattened result row
+RACE_META = ['season', 'round', 'raceName', 'date', ['Circuit', 'circuitId'], ['Circuit', 'circuitName']]
+
+def _column(frame: pd.DataFrame, name: str, default: str) -> Any:
+    """Column with missing values filled, or the default if the column is absent"""
+    return frame[name].fillna(default) if name in frame else default
+
+# Numeric columns Ergast returns as strings; nullable ints keep missing values.
+# season stays a string, as the analysis prompts instruct the model to expect
+NUMERIC_DTYPES = {
+    'round': 'Int8',
+    'position': 'Int16',
+    'points': 'float32',
+    'wins': 'Int16',
+    'driverNumber': 'Int16'
+}
+
+def _with_dtypes(frame: pd.DataFrame) -> pd.DataFrame:
+    """Convert the known numeric columns in place of object-dtype strings"""
+    for name, dtype in NUMERIC_DTYPES.items():
+        if name in frame:
+            frame[name] = pd.to_numeric(frame[name], errors='coerce').astype(dtype)
+    return frame
+
+def _race_columns(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Race-level columns from a normalized race or result frame"""
+    return {
+        'season': frame['season'],
+        'round': frame['round'],
+        'raceName': frame['raceName'],
+        'date': _column(frame, 'date', ''),
+        'circuitId': frame['Circuit.circuitId'],
+        'circuitName': frame['Circuit.circuitName']
+    }
 
 def process_f1_data(raw_data: Dict[Any, Any]) -> pd.DataFrame:
     """
@@ -89,78 +144,143 @@ def process_f1_data(raw_data: Dict[Any, Any]) -> pd.DataFrame:
     
     # Handle different table types
     if 'Races' in table_data:
-        # Flatten race data
-        races_data = []
-        for race in table_data['Races']:
-            race_info = {
-                'season': race['season'],
-                'round': race['round'],
-                'raceName': race['raceName'],
-                'date': race.get('date', ''),
-                'circuitId': race['Circuit']['circuitId'],
-                'circuitName': race['Circuit']['circuitName']
-            }
-            
-            # Add results if available
-            if 'Results' in race:
-                for result in race['Results']:
-                    result_info = race_info.copy()
-                    result_info.update({
-                        'driverId': result['Driver']['driverId'],
-                        'driverName': f"{result['Driver']['givenName']} {result['Driver']['familyName']}",
-                        'constructorId': result['Constructor']['constructorId'],
-                        'position': result.get('position', ''),
-                        'points': result.get('points', '0')
-                    })
-                    races_data.append(result_info)
-            else:
-                races_data.append(race_info)
-        return pd.DataFrame(races_data)
+        races = table_data['Races']
+        with_results = [race for race in races if 'Results' in race]
+        frames = []
+        if with_results:
+            # One row per result, carrying the race fields alongside
+            results = pd.json_normalize(with_results, record_path='Results', meta=RACE_META, errors='ignore')
+            frames.append(pd.DataFrame({
+                **_race_columns(results),
+                'driverId': results['Driver.driverId'],
+                'driverName': results['Driver.givenName'] + ' ' + results['Driver.familyName'],
+                'constructorId': results['Constructor.constructorId'],
+                'position': _column(results, 'position', ''),
+                'points': _column(results, 'points', '0')
+            }))
+        if len(with_results) < len(races):
+            race_rows = pd.json_normalize([race for race in races if 'Results' not in race])
+            frames.append(pd.DataFrame(_race_columns(race_rows)))
+        if not frames:
+            return pd.DataFrame()
+        return _with_dtypes(frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True))
         
     elif 'Drivers' in table_data:
         # Process driver data
-        drivers_data = [{
-            'driverId': driver['driverId'],
-            'driverNumber': driver.get('permanentNumber', ''),
-            'code': driver.get('code', ''),
-            'driverName': f"{driver['givenName']} {driver['familyName']}",
-            'nationality': driver.get('nationality', '')
-        } for driver in table_data['Drivers']]
-        return pd.DataFrame(drivers_data)
+        drivers = pd.json_normalize(table_data['Drivers'])
+        if drivers.empty:
+            return pd.DataFrame()
+        return _with_dtypes(pd.DataFrame({
+            'driverId': drivers['driverId'],
+            'driverNumber': _column(drivers, 'permanentNumber', ''),
+            'code': _column(drivers, 'code', ''),
+            'driverName': drivers['givenName'] + ' ' + drivers['familyName'],
+            'nationality': _column(drivers, 'nationality', '')
+        }))
         
     elif 'StandingsLists' in table_data:
         # Process standings data
-        standings_data = []
-        for standing_list in table_data['StandingsLists']:
-            if 'ConstructorStandings' in standing_list:
-                for standing in standing_list['ConstructorStandings']:
-                    standings_data.append({
-                        'position': standing['position'],
-                        'points': standing['points'],
-                        'wins': standing['wins'],
-                        'constructorId': standing['Constructor']['constructorId'],
-                        'constructorName': standing['Constructor']['name'],
-                        'nationality': standing['Constructor']['nationality']
-                    })
-            elif 'DriverStandings' in standing_list:
-                for standing in standing_list['DriverStandings']:
-                    standings_data.append({
-                        'position': standing['position'],
-                        'points': standing['points'],
-                        'wins': standing['wins'],
-                        'driverId': standing['Driver']['driverId'],
-                        'driverName': f"{standing['Driver']['givenName']} {standing['Driver']['familyName']}",
-                        'constructorId': standing['Constructors'][0]['constructorId']
-                    })
-        return pd.DataFrame(standings_data)
+        standing_lists = table_data['StandingsLists']
+        frames = []
+        constructor_lists = [s for s in standing_lists if 'ConstructorStandings' in s]
+        if constructor_lists:
+            standings = pd.json_normalize(constructor_lists, record_path='ConstructorStandings')
+            frames.append(pd.DataFrame({
+                'position': standings['position'],
+                'points': standings['points'],
+                'wins': standings['wins'],
+                'constructorId': standings['Constructor.constructorId'],
+                'constructorName': standings['Constructor.name'],
+                'nationality': standings['Constructor.nationality']
+            }))
+        driver_lists = [s for s in standing_lists if 'DriverStandings' in s and 'ConstructorStandings' not in s]
+        if driver_lists:
+            standings = pd.json_normalize(driver_lists, record_path='DriverStandings')
+            frames.append(pd.DataFrame({
+                'position': standings['position'],
+                'points': standings['points'],
+                'wins': standings['wins'],
+                'driverId': standings['Driver.driverId'],
+                'driverName': standings['Driver.givenName'] + ' ' + standings['Driver.familyName'],
+                'constructorId': standings['Constructors'].str[0].str['constructorId']
+            }))
+        if not frames:
+            return pd.DataFrame()
+        return _with_dtypes(frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True))
     
     return pd.DataFrame()
 
-def analyze_and_visualize(endpoint: str, query: str) -> Dict[str, Any]:
+def parse_f1_data(body: bytes) -> pd.DataFrame:
+    """
+    Decode and flatten an Ergast response body; the parsed tree is
+    released as soon as the DataFrame is built
+    """
+    return process_f1_data(orjson.loads(body))
+
+_NATIONALITY_DISTRIBUTION_RE = re.compile(r"\bdistribution\b.*\bnationalit", re.IGNORECASE)
+# Only plain "wins per driver" phrasings; anything naming a driver, circuit
+# or comparison ("most", "vs") has to go through generated code
+_WINS_RE = re.compile(
+    r"\s*(?:(?:show|plot|chart|count|list)\s+)?(?:the\s+)?(?:(?:number|count)\s+of\s+)?"
+    r"(?:race\s+)?wins\s+(?:by|per|for\s+each)\s+drivers?(?:\s+in\s+\d{4})?\s*\??\s*"
+    r"|\s*how\s+many\s+(?:races\s+did\s+each\s+driver\s+win|wins\s+did\s+each\s+driver\s+have)"
+    r"(?:\s+in\s+\d{4})?\s*\??\s*",
+    re.IGNORECASE
+)
+
+def _bar_chart(counts: Counter, title: str) -> str:
+    """Render counts as a bar chart, returned as base64 PNG"""
+    labels, values = zip(*counts.most_common())
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bar(labels, values)
+    ax.set_title(title)
+    ax.tick_params(axis='x', rotation=45)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return binascii.b2a_base64(buffer.getbuffer(), newline=False).decode('ascii')
+
+def _try_trivial(query: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """
+    Answer pure counting queries (nationality distribution, race wins)
+    directly; None means the query needs generated code
+    """
+    if _NATIONALITY_DISTRIBUTION_RE.search(query) and 'nationality' in df:
+        counts = Counter(df['nationality'])
+    elif (
+        _WINS_RE.fullmatch(query)
+        and 'wins' not in df
+        and 'position' in df
+        and 'driverName' in df
+    ):
+        # Race results only: standings frames carry the real totals in 'wins'
+        counts = Counter(df.loc[df['position'].eq(1).fillna(False), 'driverName'])
+    else:
+        return None
+    if not counts:
+        return None
+    
+    return {
+        "success": True,
+        "output": ", ".join(f"{label}: {count}" for label, count in counts.most_common()),
+        "figure": _bar_chart(counts, query),
+        "data": df.to_dict('records')
+    }
+
+async def analyze_and_visualize(
+    session: aiohttp.ClientSession,
+    rate_limit: asyncio.Semaphore,
+    code_log: "asyncio.Queue[bytes]",
+    endpoint: str,
+    query: str
+) -> Dict[str, Any]:
     """
     Fetch F1 data, process it, and generate visualization based on the query
     
     Args:
+        session: Shared aiohttp session
+        rate_limit: Semaphore serializing API requests
+        code_log: Queue for generated-code log records
         endpoint (str): The F1 API endpoint to fetch data from
         query (str): The natural language query to analyze the data
         
@@ -168,16 +288,19 @@ def analyze_and_visualize(endpoint: str, query: str) -> Dict[str, Any]:
         Dict containing success status, visualization, and any error messages
     """
     try:
-        # Fetch raw data
-        raw_data = fetch_f1_data(endpoint)
-        if not raw_data:
+        # Fetch raw data, one request at a time to respect rate limiting
+        async with rate_limit:
+            body = await fetch_f1_data(session, endpoint)
+            await asyncio.sleep(RATE_LIMIT_DELAY)
+        if not body:
             return {
                 "success": False,
                 "error": "Failed to fetch data from F1 API"
             }
             
-        # Process into DataFrame
-        df = process_f1_data(raw_data)
+        # Decode and flatten off the event loop so other fetches keep going
+        df = await asyncio.to_thread(parse_f1_data, body)
+        del body
         if df.empty:
             return {
                 "success": False,
@@ -188,8 +311,14 @@ def analyze_and_visualize(endpoint: str, query: str) -> Dict[str, Any]:
         print(df.head())
         print("\nColumns:", df.columns.tolist())
         
+        # Simple count queries are answered directly without an LLM call
+        trivial = _try_trivial(query, df)
+        if trivial is not None:
+            return trivial
+        
         # Generate visualization code
-        generated_code = generate_code(df, query)
+        # The LLM call blocks, so run it off the event loop
+        generated_code = await asyncio.to_thread(generate_code, df, query)
         if not generated_code:
             return {
                 "success": False,
@@ -199,14 +328,14 @@ def analyze_and_visualize(endpoint: str, query: str) -> Dict[str, Any]:
         # Extract the actual code from the markdown code block
         code = extract_code_block(generated_code)
         if not code:
-            log_generated_code(query, generated_code, False)
+            log_generated_code(code_log, query, generated_code, False)
             return {
                 "success": False,
                 "error": "Failed to extract code from generated response"
             }
             
         # Log the extracted code
-        log_generated_code(query, code, True)
+        log_generated_code(code_log, query, code, True)
             
         # Execute the code
         success, result, executed_code = execute_code_safely(code, df)
@@ -220,13 +349,13 @@ def analyze_and_visualize(endpoint: str, query: str) -> Dict[str, Any]:
         
     except Exception as e:
         if 'code' in locals():
-            log_generated_code(query, code, False)
+            log_generated_code(code_log, query, code, False)
         return {
             "success": False,
             "error": f"Error in analysis pipeline: {str(e)}"
         }
 
-def run_test_queries():
+async def run_test_queries():
     """
     Test different API endpoints
     """
@@ -246,9 +375,26 @@ def run_test_queries():
         }
     ]
     
-    for test_case in test_cases:
+    # Created here so the queue belongs to the running event loop
+    code_log: "asyncio.Queue[bytes]" = asyncio.Queue()
+    log_writer = asyncio.create_task(_code_log_writer(code_log))
+    connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+        rate_limit = asyncio.Semaphore(1)
+        results = await asyncio.gather(*[
+            analyze_and_visualize(session, rate_limit, code_log, test_case['endpoint'], test_case['query'])
+            for test_case in test_cases
+        ])
+    
+    # Flush any pending code log records before reporting
+    await code_log.join()
+    log_writer.cancel()
+    with suppress(asyncio.CancelledError):
+        await log_writer
+    print(f"\nLogged generated code to: {CODE_LOG_FILE}")
+    
+    for test_case, result in zip(test_cases, results):
         print(f"\nProcessing: {test_case['query']}")
-        result = analyze_and_visualize(test_case['endpoint'], test_case['query'])
         
         if result['success']:
             print("✓ Successfully generated visualization")
@@ -256,10 +402,7 @@ def run_test_queries():
                 print("Output:", result['output'])
         else:
             print("✗ Error:", result['error'])
-            
-        # Respect rate limiting
-        time.sleep(0.25)
 
 if __name__ == "__main__":
     print("Starting F1 API Tests with Visualization...")
-    run_test_queries() 
\ No newline at end of file
+    asyncio.run(run_test_queries()) 
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""Coalesces concurrent single-query completions into one batched request"""
+import asyncio
+import logging
+from contextlib import suppress
+from typing import List, Set, Tuple
+import orjson
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 16
+MAX_WAIT = 0.02  # seconds to wait for more queries after the first arrives
+MAX_TOKENS = 100  # per query; answers are small JSON objects
+
+class CompletionBatcher:
+    """
+    Sends queries arriving within MAX_WAIT of each other as one chat completion.
+    Every query shares the same system instructions, so a batch pays for them once.
+    Each caller gets back the JSON object text for its own query.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        instructions: str,
+        max_batch: int = MAX_BATCH,
+        max_wait: float = MAX_WAIT,
+        max_tokens: int = MAX_TOKENS
+    ):
+        self.client = client
+        self.model = model
+        self.instructions = instructions
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_tokens = max_tokens
+        self._queue: "asyncio.Queue[Tuple[str, asyncio.Future[str]]]" = asyncio.Queue()
+        self._collector = None
+        # Keep references so in-flight batches are not garbage collected
+        self._batches: Set[asyncio.Task] = set()
+
+    async def submit(self, query: str) -> str:
+        """Queue a query and wait for its completion text"""
+        if self._collector is None or self._collector.done():
+            self._collector = asyncio.create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        return await future
+
+    async def aclose(self):
+        """Stop collecting, cancel in-flight batches and fail every query still waiting"""
+        tasks = [task for task in (self._collector, *self._batches) if task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._collector = None
+        queued = []
+        while not self._queue.empty():
+            queued.append(self._queue.get_nowait())
+        self._fail(queued, RuntimeError("Completion batcher closed"))
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, "asyncio.Future[str]"]], error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+                except asyncio.CancelledError:
+                    # Closed while gathering a batch; its callers must not wait forever
+                    self._fail(batch, RuntimeError("Completion batcher closed"))
+                    raise
+            task = asyncio.create_task(self._complete(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _complete(self, batch: List[Tuple[str, "asyncio.Future[str]"]]):
+        try:
+            await self._settle(batch)
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError("Completion batcher closed"))
+            raise
+
+    async def _settle(self, batch: List[Tuple[str, "asyncio.Future[str]"]]):
+        if len(batch) == 1:
+            await self._answer(*batch[0])
+            return
+        try:
+            contents = await self._request_batch([query for query, _ in batch])
+        except ValueError as e:
+            # A malformed reply says nothing about the individual queries; ask for each on its own
+            logger.warning("Unusable batched response, retrying %d queries singly: %s", len(batch), e)
+            await asyncio.gather(*(self._answer(query, future) for query, future in batch))
+            return
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        for (_, future), content in zip(batch, contents):
+            if not future.done():
+                future.set_result(content)
+
+    async def _answer(self, query: str, future: "asyncio.Future[str]"):
+        """Request a single query and settle its future"""
+        try:
+            content = await self._request("Query: " + query)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(content)
+
+    async def _request_batch(self, queries: List[str]) -> List[str]:
+        numbered = "\n".join(f"{i}. {query}" for i, query in enumerate(queries, 1))
+        content = (
+            f'Return a JSON object {{"results": [...]}} with {len(queries)} items, '
+            + "where item i is the structure above for query i.\n\nQueries:\n"
+            + numbered
+        )
+        parsed = orjson.loads(await self._request(content, len(queries)))
+        results = parsed.get("results") if isinstance(parsed, dict) else None
+        if not isinstance(results, list) or len(results) != len(queries):
+            raise ValueError(f"Batched response does not hold {len(queries)} results")
+        logger.debug("Answered %d queries in one request", len(queries))
+        return [orjson.dumps(result).decode() for result in results]
+
+    async def _request(self, content: str, n_queries: int = 1) -> str:
+        # Static instructions go first as the system message so the provider
+        # can reuse its cached prefix; only the short user message varies
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.instructions},
+                {"role": "user", "content": content}
+            ],
+            temperature=0,
+            max_tokens=self.max_tokens * n_queries,
+            response_format={"type": "json_object"}
+        )
+        content = response.choices[0].message.content
+        if content is None:
+            raise ValueError("No content in response")
+        return content
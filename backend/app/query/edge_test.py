@@ -1,9 +1,12 @@
 """Edge case testing for Q2 query processing system"""
 import asyncio
-import json
+import orjson
 from datetime import datetime
+from typing import Any, BinaryIO, Dict
 from .processor import QueryProcessor
 
+MAX_CONCURRENT_QUERIES = 5
+
 async def run_edge_tests():
     processor = QueryProcessor()
     
@@ -39,30 +42,33 @@ async def run_edge_tests():
         "Show me the average gap between teammates in qualifying but only count sessions where track temperature was above 40°C and both cars made it to Q3"
     ]
     
-    results = []
-    for query in edge_queries:
-        try:
-            result = await processor.process_query(query)
-            results.append({
-                "query": query,
-                "endpoint": result.requirements.endpoint,
-                "parameters": result.requirements.params,
-                "confidence": result.confidence,
-                "processing_time": result.processing_time,
-                "source": result.source
-            })
-        except Exception as e:
-            results.append({
-                "query": query,
-                "error": str(e)
-            })
+    # Overlap the LLM round-trips while staying within provider rate limits
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
     
-    # Save results
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    with open(f'edge_test_results_{timestamp}.json', 'w') as f:
-        json.dump(results, f, indent=2)
+    async def run_query(query: str, out: BinaryIO) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await processor.process_query(query)
+                record = {
+                    "query": query,
+                    "endpoint": result.requirements.endpoint,
+                    "parameters": result.requirements.params,
+                    "confidence": result.confidence,
+                    "processing_time": result.processing_time,
+                    "source": result.source
+                }
+            except Exception as e:
+                record = {
+                    "query": query,
+                    "error": str(e)
+                }
+        # Append each result as one JSON line as soon as it completes
+        out.write(orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+        return record
     
-    return results
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with open(f'edge_test_results_{timestamp}.jsonl', 'wb') as f:
+        return await asyncio.gather(*(run_query(query, f) for query in edge_queries))
 
 if __name__ == "__main__":
     results = asyncio.run(run_edge_tests())
@@ -85,7 +91,7 @@ if __name__ == "__main__":
             total_time += result['processing_time']
             total_confidence += result['confidence']
             print(f"Endpoint: {result['endpoint']}")
-            print(f"Parameters: {json.dumps(result['parameters'], indent=2)}")
+            print(f"Parameters: {orjson.dumps(result['parameters'], option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}")
             print(f"Confidence: {result['confidence']:.2f}")
             print(f"Processing Time: {result['processing_time']:.3f}s")
             print("✅ Success")
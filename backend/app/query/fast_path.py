@@ -0,0 +1,178 @@
+"""Local resolution of common F1 queries to data requirements, without an LLM call"""
+import re
+from difflib import get_close_matches
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .models import DataRequirements
+from .semantic_cache import normalize_query
+
+# Ergast driver ids for names the query templates recognise
+DRIVER_IDS = {
+    "max verstappen": "max_verstappen",
+    "lewis hamilton": "hamilton",
+    "charles leclerc": "leclerc",
+    "lando norris": "norris",
+    "carlos sainz": "sainz",
+    "sergio perez": "perez",
+    "george russell": "russell",
+    "fernando alonso": "alonso",
+    "oscar piastri": "piastri",
+    "valtteri bottas": "bottas",
+    "sebastian vettel": "vettel",
+}
+
+def _results_params(m: re.Match) -> Optional[Dict[str, Any]]:
+    driver = DRIVER_IDS.get(m["driver"])
+    return driver and {"driver": driver, "season": m["season"]}
+
+def _qualifying_comparison_params(m: re.Match) -> Optional[Dict[str, Any]]:
+    drivers = [DRIVER_IDS.get(m["driver1"]), DRIVER_IDS.get(m["driver2"])]
+    if None in drivers:
+        return None
+    return {"driver": drivers, "circuit": m["circuit"].replace(" ", "_"), "season": m["season"]}
+
+# Templated queries answered without an LLM call: (pattern, endpoint, params builder).
+# Patterns run against the normalized (lowercase, single-spaced) query; a builder
+# returns None when it does not recognise a name, which falls through to the LLM.
+# Single-driver templates are anchored at the start so that in "a and b results"
+# the driver group cannot skip ahead to the last name.
+QUERY_TEMPLATES = (
+    (
+        re.compile(r"^(?:show|get|what (?:were|are)) (?:me )?(?P<driver>[a-z]+ [a-z]+)(?:'s)? (?:race )?(?:results|positions|finishes) (?:in|for|during) (?:the )?(?P<season>\d{4})\b"),
+        "/api/f1/races",
+        _results_params
+    ),
+    (
+        re.compile(r"\bcompare (?P<driver1>[a-z]+ [a-z]+) (?:and|vs\.?|with) (?P<driver2>[a-z]+ [a-z]+)(?:'s)? qualifying (?:at|in) (?:the )?(?P<circuit>[a-z ]+?) (?P<season>\d{4})\b"),
+        "/api/f1/qualifying",
+        _qualifying_comparison_params
+    ),
+    (
+        re.compile(r"^(?:(?:show|get|what (?:were|are)) (?:me )?)?(?P<driver>[a-z]+ [a-z]+)(?:'s)? qualifying (?:results |positions )?(?:in|for|during) (?:the )?(?P<season>\d{4})\b"),
+        "/api/f1/qualifying",
+        _results_params
+    ),
+)
+
+def match_template(query: str) -> Optional[DataRequirements]:
+    """Build requirements locally when the query matches a known template"""
+    normalized = normalize_query(query)
+    for pattern, endpoint, build_params in QUERY_TEMPLATES:
+        match = pattern.search(normalized)
+        if match:
+            params = build_params(match)
+            if params:
+                return DataRequirements(endpoint=endpoint, params=params)
+    return None
+
+# Surnames are enough to identify a driver outside the templates
+DRIVER_SURNAMES = {name.split()[-1]: driver_id for name, driver_id in DRIVER_IDS.items()}
+
+CONSTRUCTOR_IDS = {
+    "red bull": "red_bull",
+    "ferrari": "ferrari",
+    "mercedes": "mercedes",
+    "mclaren": "mclaren",
+    "aston martin": "aston_martin",
+    "alpine": "alpine",
+    "williams": "williams",
+    "haas": "haas",
+}
+
+CIRCUIT_IDS = {
+    "monaco": "monaco",
+    "monza": "monza",
+    "silverstone": "silverstone",
+    "spa": "spa",
+    "suzuka": "suzuka",
+    "interlagos": "interlagos",
+    "bahrain": "bahrain",
+    "baku": "baku",
+}
+
+# First keyword found decides the endpoint, so more specific words come first.
+# Keywords match whole words only, so "pole" does not fire on "napoleon".
+ENDPOINT_KEYWORDS = (
+    (re.compile(r"\bqualifying\b"), "/api/f1/qualifying"),
+    (re.compile(r"\bpoles?\b"), "/api/f1/qualifying"),
+    (re.compile(r"\bpit ?stops?\b|\bpits?\b"), "/api/f1/pitstops"),
+    (re.compile(r"\blap ?times?\b"), "/api/f1/laps"),
+    (re.compile(r"\bresults?\b"), "/api/f1/races"),
+    (re.compile(r"\bfinish(?:es|ed)?\b"), "/api/f1/races"),
+    (re.compile(r"\braces?\b"), "/api/f1/races"),
+)
+_KEYWORD_RE = re.compile("|".join(pattern.pattern for pattern, _ in ENDPOINT_KEYWORDS))
+
+YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+WORD_RE = re.compile(r"[a-z]+")
+# Comparisons, ranges and trends need the LLM to plan the request
+AMBIGUOUS_RE = re.compile(r"\b(?:compare|vs|versus|since|between|across|last|trend|average|best|worst)\b")
+# Words that add no constraint to a request for a whole season's data
+FILLER_WORDS = frozenset((
+    "show", "get", "give", "list", "what", "were", "was", "are", "is", "me", "all",
+    "the", "in", "for", "of", "during", "season", "s", "f", "formula", "one",
+))
+
+def _find_aliases(padded_words: str, aliases: Dict[str, str]) -> Set[str]:
+    """Match whole words only, so an alias like spa does not fire on spain"""
+    return {alias_id for alias, alias_id in aliases.items() if f" {alias} " in padded_words}
+
+def _find_drivers(words: List[str]) -> Set[str]:
+    """Exact surname matches, plus close matches to tolerate misspellings"""
+    drivers = set()
+    for word in words:
+        if word in DRIVER_SURNAMES:
+            drivers.add(DRIVER_SURNAMES[word])
+            continue
+        close = get_close_matches(word, DRIVER_SURNAMES, n=1, cutoff=0.85)
+        if close:
+            drivers.add(DRIVER_SURNAMES[close[0]])
+    return drivers
+
+def match_rules(query: str) -> Optional[DataRequirements]:
+    """Build requirements from a year, an endpoint keyword and at most one known name of each kind"""
+    normalized = normalize_query(query)
+    if AMBIGUOUS_RE.search(normalized):
+        return None
+    years = YEAR_RE.findall(normalized)
+    if len(years) != 1:
+        return None
+    endpoint = next((ep for pattern, ep in ENDPOINT_KEYWORDS if pattern.search(normalized)), None)
+    if endpoint is None:
+        return None
+
+    words = WORD_RE.findall(normalized)
+    padded_words = f" {' '.join(words)} "
+    drivers = _find_drivers(words)
+    constructors = _find_aliases(padded_words, CONSTRUCTOR_IDS)
+    circuits = _find_aliases(padded_words, CIRCUIT_IDS)
+    # A single-entity request would answer for only one of several names
+    if len(drivers) > 1 or len(constructors) > 1 or len(circuits) > 1:
+        return None
+
+    params: Dict[str, Any] = {"season": years[0]}
+    if drivers:
+        params["driver"] = drivers.pop()
+    if constructors:
+        params["constructor"] = constructors.pop()
+    if circuits:
+        params["circuit"] = circuits.pop()
+    if len(params) == 1:
+        # A bare season fetch is only right when nothing else constrains the question
+        remaining = WORD_RE.findall(_KEYWORD_RE.sub(" ", normalized))
+        if any(word not in FILLER_WORDS for word in remaining):
+            return None
+    return DataRequirements(endpoint=endpoint, params=params)
+
+# (resolver, result source, confidence), tried in order
+FAST_PATHS = (
+    (match_template, "template", 0.9),
+    (match_rules, "rules", 0.8),
+)
+
+def resolve_fast_path(query: str) -> Optional[Tuple[DataRequirements, str, float]]:
+    """Return (requirements, source, confidence) from the first resolver that matches"""
+    for resolve, source, confidence in FAST_PATHS:
+        requirements = resolve(query)
+        if requirements is not None:
+            return requirements, source, confidence
+    return None
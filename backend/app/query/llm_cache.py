@@ -0,0 +1,53 @@
+"""Disk-backed cache for deterministic LLM completions"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", Path(__file__).parent / ".cache" / "llm_responses.sqlite"))
+
+class LLMResponseCache:
+    """
+    Stores temperature=0 completions keyed by sha256(model + prompt);
+    methods block on disk, so async callers run them via asyncio.to_thread
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # The connection is shared across worker threads
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}|{prompt}".encode()).hexdigest()
+
+    def get(self, model: str, prompt: str, max_age: Optional[float] = None) -> Optional[str]:
+        """Stored completion, ignoring entries older than max_age seconds if given"""
+        oldest = time.time() - max_age if max_age is not None else 0.0
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM responses WHERE key = ? AND created >= ?", (self.make_key(model, prompt), oldest)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, model: str, prompt: str, content: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, created) VALUES (?, ?, ?)",
+                (self.make_key(model, prompt), content, time.time())
+            )
+            self._conn.commit()
+
+@lru_cache(maxsize=1)
+def default_llm_cache() -> LLMResponseCache:
+    """Process-wide cache instance"""
+    return LLMResponseCache()
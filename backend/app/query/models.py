@@ -1,18 +1,32 @@
 """Shared data models for query processing"""
 from dataclasses import dataclass, field
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Hashable
 
-@dataclass
+def _freeze(value: Any) -> Hashable:
+    """Hashable equivalent of nested JSON-style params"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+@dataclass(slots=True, frozen=True)
 class DataRequirements:
     """Requirements for fetching F1 data"""
     endpoint: str  # The F1 API endpoint to query
     params: Dict[str, Any]  # Parameters for the API call
 
-@dataclass
+    def __hash__(self) -> int:
+        # The generated hash would fail on the params dict; hash a frozen copy
+        # so equal requirements can key caches and sets directly
+        return hash((self.endpoint, _freeze(self.params)))
+
+@dataclass(slots=True, frozen=True)
 class ProcessingResult:
     """Enhanced result structure for comparison"""
     requirements: DataRequirements
     processing_time: float
     source: str  # 'q2' or 'legacy'
     confidence: float = 0.0
-    trace: List[str] = field(default_factory=list) 
\ No newline at end of file
+    trace: List[str] = field(default_factory=list)
+    fallback: bool = False  # default requirements used after processing failed 
\ No newline at end of file
@@ -1,18 +1,104 @@
-from dataclasses import dataclass, field
-from typing import Dict, Any, List, Union, Optional, Tuple
+from dataclasses import dataclass, field, replace
+from typing import Dict, Any, List, Union, Optional, Sequence, Tuple
 import os
-import json
+import logging
+import orjson
 import asyncio
 import time
+import httpx
+from pathlib import Path
+from functools import lru_cache
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from .models import DataRequirements, ProcessingResult
 from .q2_assistants import Q2Processor, Q2Result
+from .semantic_cache import SemanticCache
+from .fast_path import resolve_fast_path
+from .llm_cache import default_llm_cache
+from .batcher import CompletionBatcher
 from datetime import datetime
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+LEGACY_MODEL = "gpt-4o-mini"
+QUERY_CACHE_PATH = Path(__file__).parent / ".cache" / "query_results.pkl"
+
+# Common queries processed at startup so their first real request is a cache hit
+WARMUP_QUERIES = (
+    "2024 driver standings",
+    "last race results",
+    "max verstappen 2024",
+)
+WARMUP_CONCURRENCY = 5
+
+# Keep warm connections to the API so bursts skip TCP/TLS setup
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Compact schema plus one static example, in place of commented-JSON documentation
+LEGACY_INSTRUCTIONS = """Map the F1 query to JSON {"endpoint": E, "params": P}. JSON only.
+E: /api/f1/races | /api/f1/qualifying | /api/f1/drivers | /api/f1/constructors | /api/f1/laps | /api/f1/pitstops
+P (all optional): season ("2023" or list of years), circuit, driver (string or list), constructor, round ("1"). Names in snake_case, e.g. max_verstappen, red_bull, monaco.
+Example: "Leclerc's qualifying at Monaco 2023" -> {"endpoint": "/api/f1/qualifying", "params": {"driver": "leclerc", "circuit": "monaco", "season": "2023"}}"""
+
+# Endpoints the legacy prompt allows the model to choose from
+LEGACY_ENDPOINTS = frozenset({
+    "/api/f1/races",
+    "/api/f1/qualifying",
+    "/api/f1/drivers",
+    "/api/f1/constructors",
+    "/api/f1/laps",
+    "/api/f1/pitstops",
+})
+
+def _parse_legacy_response(content: Union[str, bytes], default_season: str) -> DataRequirements:
+    """Decode, check and convert a legacy response in one pass, raising ValueError if malformed"""
+    parsed = orjson.loads(content)
+    if type(parsed) is not dict:
+        raise ValueError("Response is not a JSON object")
+    endpoint = parsed.get("endpoint")
+    params = parsed.get("params")
+    if type(endpoint) is not str or endpoint not in LEGACY_ENDPOINTS:
+        raise ValueError(f"Invalid 'endpoint' in response: {endpoint!r}")
+    if type(params) is not dict:
+        raise ValueError("Missing 'params' object in response")
+    # Ensure we have a year parameter
+    if "season" not in params and "year" not in params:
+        params["season"] = default_season
+    return DataRequirements(endpoint=endpoint, params=params)
+
+@lru_cache(maxsize=8)
+def _openai_client(api_key: str, loop: Optional[asyncio.AbstractEventLoop]) -> AsyncOpenAI:
+    """Shared client per API key and event loop, so instances reuse one connection pool"""
+    http_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+@lru_cache(maxsize=8)
+def _query_cache(client: AsyncOpenAI) -> SemanticCache:
+    """Result cache shared by every processor using the same client; aclose saves it"""
+    cache = SemanticCache(client, path=QUERY_CACHE_PATH)
+    cache.load()
+    return cache
+
+@lru_cache(maxsize=8)
+def _legacy_batcher(client: AsyncOpenAI) -> CompletionBatcher:
+    """Batcher shared by every processor using the same client"""
+    return CompletionBatcher(client, LEGACY_MODEL, LEGACY_INSTRUCTIONS)
+
+@lru_cache(maxsize=1)
+def get_processor() -> "QueryProcessor":
+    """Process-wide processor, for use as a FastAPI dependency"""
+    return QueryProcessor()
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
 class QueryProcessor:
     """Maps natural language queries to F1 data requirements"""
     
@@ -20,9 +106,12 @@ class QueryProcessor:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = _openai_client(api_key, _running_loop())
         # Q2: Initialize Q2 processor
         self.q2_processor = Q2Processor(self.client)
+        self.cache = _query_cache(self.client)
+        self.llm_cache = default_llm_cache()
+        self.batcher = _legacy_batcher(self.client)
         self.current_year = str(datetime.now().year)
         
     async def process_query(self, query: str, use_q2: bool = True) -> ProcessingResult:
@@ -30,125 +119,152 @@ class QueryProcessor:
         Enhanced query processing with Q2 system
         Maintains backward compatibility while allowing Q2 processing
         """
-        results = []
+        start_time = time.time()
+        # Cheap local resolution first; the LLMs only see queries it cannot place
+        fast = resolve_fast_path(query)
+        if fast is not None:
+            requirements, source, confidence = fast
+            return ProcessingResult(
+                requirements=requirements,
+                processing_time=time.time() - start_time,
+                source=source,
+                confidence=confidence
+            )
+        
+        result, cache_hit = await self.cache.get_or_compute(query, lambda: self._process_uncached(query, use_q2))
+        if cache_hit:
+            return replace(result, processing_time=time.time() - start_time)
+        return result
+    
+    async def aclose(self):
+        """Save the query cache and close the shared HTTP connection pool; call once at shutdown"""
+        # Every cache writes the same file, so only the shutting-down processor's is saved
+        self.cache.save()
+        await self.batcher.aclose()
+        await self.client.close()
+        # Everything memoized on top of the closed client goes with it, so a later
+        # lifespan (tests, reloads) builds fresh objects instead of reusing dead ones
+        get_processor.cache_clear()
+        _legacy_batcher.cache_clear()
+        _query_cache.cache_clear()
+        _openai_client.cache_clear()
+    
+    async def warmup(self, queries: Sequence[str] = WARMUP_QUERIES):
+        """Populate the query cache ahead of real traffic; failures are ignored"""
+        semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
         
+        async def warm(query: str):
+            async with semaphore:
+                await self.process_query(query)
+        
+        await asyncio.gather(*(warm(q) for q in queries), return_exceptions=True)
+    
+    async def _process_uncached(self, query: str, use_q2: bool) -> ProcessingResult:
+        """Race Q2 and legacy processing and choose the best result"""
+        tasks = {asyncio.create_task(self._run_legacy(query))}
         # Q2: Try Q2 processing if enabled
         if use_q2:
-            try:
-                start_time = time.time()
-                q2_result = await self.q2_processor.process_query(query)
-                q2_time = time.time() - start_time
-                
-                results.append(ProcessingResult(
-                    requirements=q2_result.requirements,
-                    processing_time=q2_time,
-                    source='q2',
-                    confidence=q2_result.confidence,
-                    trace=q2_result.agent_trace
-                ))
-            except Exception as e:
-                print(f"Q2 processing failed: {str(e)}")
+            tasks.add(asyncio.create_task(self._run_q2(query)))
         
-        # Always run legacy processing for comparison during phase 1
+        results = []
+        pending = tasks
         try:
-            start_time = time.time()
-            legacy_requirements = await self._legacy_process_query(query)
-            legacy_time = time.time() - start_time
-            
-            results.append(ProcessingResult(
-                requirements=legacy_requirements,
-                processing_time=legacy_time,
-                source='legacy',
-                confidence=0.5  # Default confidence for legacy system
-            ))
-        except Exception as e:
-            print(f"Legacy processing failed: {str(e)}")
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                results.extend(r for r in (task.result() for task in done) if r is not None)
+                
+                # Q2: During phase 1, prefer Q2 result if confidence is high enough,
+                # without waiting for the slower path
+                q2_results = [r for r in results if r.source == 'q2']
+                if q2_results and q2_results[0].confidence > 0.8:
+                    return q2_results[0]
+        finally:
+            for task in pending:
+                task.cancel()
         
         # Choose the best result
         if not results:
             raise ValueError("Both processing methods failed")
         
-        # Q2: During phase 1, prefer Q2 result if confidence is high enough
-        q2_results = [r for r in results if r.source == 'q2']
-        if q2_results and q2_results[0].confidence > 0.8:
-            return q2_results[0]
-        
         # Fallback to fastest result with minimum confidence
         valid_results = [r for r in results if r.confidence >= 0.5]
         if valid_results:
             return min(valid_results, key=lambda x: x.processing_time)
         
         return results[0]  # Return any result if none meet criteria
-            
-    async def _legacy_process_query(self, query: str) -> DataRequirements:
-        """Original processing logic maintained for fallback"""
+    
+    async def _run_q2(self, query: str) -> Optional[ProcessingResult]:
         try:
-            print("\nSending request to GPT-4O Mini...")
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{
-                    "role": "user",
-                    "content": """Extract relevant F1-related information from the given query to create a structured JSON object.
-
-The response must adhere to this exact JSON structure:
-{
-    "endpoint": string,  // One of: /api/f1/races, /api/f1/qualifying, /api/f1/drivers, /api/f1/constructors, /api/f1/laps, /api/f1/pitstops
-    "params": {
-        "season": string | string[],  // Optional, year like "2023" or array of years
-        "circuit": string,            // Optional, snake_case like "monaco"
-        "driver": string | string[],  // Optional, snake_case like "max_verstappen"
-        "constructor": string,        // Optional, snake_case like "red_bull"
-        "round": string               // Optional, numeric like "1"
-    }
-}
-
-Query: """ + query
-                }],
-                temperature=0,
-                response_format={ "type": "json_object" }
-            )
-            
-            print("\nReceived response from GPT-4O Mini")
-            content = response.choices[0].message.content
-            if content is None:
-                raise ValueError("No content in response")
-                
-            print("\nParsing response...")
-            parsed = json.loads(content)
-            
-            # Validate response structure
-            if not isinstance(parsed, dict):
-                raise ValueError("Response is not a JSON object")
-            if "endpoint" not in parsed:
-                raise ValueError("Missing 'endpoint' in response")
-            if "params" not in parsed:
-                raise ValueError("Missing 'params' in response")
+            start_time = time.time()
+            q2_result = await self.q2_processor.process_query(query)
+            q2_time = time.time() - start_time
             
-            # Ensure we have a year parameter
-            params = parsed["params"]
-            if "season" not in params and "year" not in params:
-                params["season"] = self.current_year
+            return ProcessingResult(
+                requirements=q2_result.requirements,
+                processing_time=q2_time,
+                source='q2',
+                confidence=q2_result.confidence,
+                trace=q2_result.agent_trace + (["Served from LLM response cache"] if q2_result.cache_hit else [])
+            )
+        except Exception as e:
+            logger.warning("Q2 processing failed: %s", e)
+            return None
+    
+    async def _run_legacy(self, query: str) -> Optional[ProcessingResult]:
+        try:
+            start_time = time.time()
+            try:
+                legacy_requirements = await self._legacy_process_query(query)
+                fallback = False
+            except Exception as e:
+                logger.warning("Error processing query, using default requirements: %s", e)
+                legacy_requirements = self._default_requirements(query)
+                fallback = True
+            legacy_time = time.time() - start_time
             
-            # Create DataRequirements object
-            requirements = DataRequirements(
-                endpoint=parsed["endpoint"],
-                params=params
+            return ProcessingResult(
+                requirements=legacy_requirements,
+                processing_time=legacy_time,
+                source='legacy',
+                confidence=0.5,  # Default confidence for legacy system
+                fallback=fallback
             )
+        except Exception as e:
+            logger.warning("Legacy processing failed: %s", e)
+            return None
             
-            print("\nProcessed requirements:", requirements)
-            return requirements
+    async def _legacy_process_query(self, query: str) -> DataRequirements:
+        """Original processing logic maintained for fallback; raises if the response is unusable"""
+        # Cache key covers the full conversation: system instructions plus query
+        prompt = LEGACY_INSTRUCTIONS + "\n\nQuery: " + query
+        
+        # Responses are deterministic at temperature 0, so reuse any stored one
+        content = await asyncio.to_thread(self.llm_cache.get, LEGACY_MODEL, prompt)
+        cached = content is not None
+        if not cached:
+            logger.debug("Sending request to %s", LEGACY_MODEL)
+            # Concurrent queries are coalesced into a single request
+            content = await self.batcher.submit(query)
+            logger.debug("Received response from %s", LEGACY_MODEL)
             
-        except Exception as e:
-            print(f"\nError processing query: {str(e)}")
-            # Return a safe default focused on the driver if we can extract it
-            default_driver = query.lower().split()[0] if query else "unknown"
-            return DataRequirements(
-                endpoint="/api/f1/drivers",
-                params={
-                    "driver": default_driver,
-                    "season": self.current_year
-                }
-            )
+        requirements = _parse_legacy_response(content, self.current_year)
+        if not cached:
+            # Only well-formed responses are worth replaying
+            await asyncio.to_thread(self.llm_cache.set, LEGACY_MODEL, prompt, content)
+        
+        logger.debug("Processed requirements: %r", requirements)
+        return requirements
+
+    def _default_requirements(self, query: str) -> DataRequirements:
+        """Safe default focused on the driver if we can extract it"""
+        default_driver = query.lower().split()[0] if query else "unknown"
+        return DataRequirements(
+            endpoint="/api/f1/drivers",
+            params={
+                "driver": default_driver,
+                "season": self.current_year
+            }
+        )
 
 async def main():
     processor = QueryProcessor()
@@ -159,8 +275,12 @@ async def main():
     print("Example: 'How has Max Verstappen's rank changed across the last 10 seasons?'")
     print("Type 'quit' to exit.\n")
     
+    # Warm the cache in the background while the user types
+    warmup = asyncio.create_task(processor.warmup())
+    
     while True:
-        query = input("\nEnter your F1 query (or 'quit' to exit): ")
+        # Read in a worker thread so background tasks (batching, warmup) keep running
+        query = await asyncio.to_thread(input, "\nEnter your F1 query (or 'quit' to exit): ")
         if query.lower() == 'quit':
             break
             
@@ -171,11 +291,14 @@ async def main():
         print(f"Confidence: {result.confidence:.2f}")
         print(f"Processing Time: {result.processing_time:.3f}s")
         print(f"Endpoint: {result.requirements.endpoint}")
-        print(f"Parameters: {json.dumps(result.requirements.params, indent=2)}")
+        print(f"Parameters: {orjson.dumps(result.requirements.params, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}")
         if result.trace:
             print("\nProcessing Trace:")
             for trace_line in result.trace:
                 print(f"  {trace_line}")
+    
+    warmup.cancel()
+    await processor.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
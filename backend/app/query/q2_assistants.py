@@ -4,43 +4,57 @@ This module implements the first phase of the multi-agent query processing syste
 Q2 refers to the "Query Quality" improvement initiative.
 """
 
-from dataclasses import dataclass, field
-from typing import Dict, Any, List, Optional, Tuple, Pattern
-import json
+from dataclasses import dataclass, field, replace
+from typing import Dict, Any, Callable, List, Optional, Tuple, Pattern
+import asyncio
 import logging
+import orjson
 import time
 import re
+from collections import OrderedDict
 from functools import lru_cache
 from openai import AsyncOpenAI
 from .models import DataRequirements
+from .fast_path import DRIVER_IDS, DRIVER_SURNAMES
+from .llm_cache import LLMResponseCache, default_llm_cache
 
 # Configure logging for Q2 system
 logger = logging.getLogger("q2_assistants")
 
-# Common query patterns for quick matching
+def _driver_id(name: str) -> str:
+    """Ergast id for a captured driver name, from the same tables the fast path uses"""
+    name = " ".join(name.lower().split())
+    return DRIVER_IDS.get(name) or DRIVER_SURNAMES.get(name.split()[-1]) or name.replace(" ", "_")
+
+# Common query patterns for quick matching. A match is answered without any LLM
+# call, so groups are delimited by literal words rather than greedy wildcards.
+# Patterns run against the lowercased query, so they carry no case-folding flag
 QUERY_PATTERNS = {
     # Performance patterns
-    r"(?i)(how|what|show).*(performance|results?).*(?P<driver>\w+\s+\w+).*(?P<year>\d{4})": {
+    r"(how|what|show)\b.*?\b(performance|results?)\s+(?:of|for)\s+(?P<driver>\w+\s+\w+)\s+in\s+(?P<year>\d{4})\b": {
+        # Literals the pattern cannot match without (lowercase substrings)
+        "keywords": ("performance", "result"),
         "action": "fetch",
         "entity": "drivers",
         "template": lambda m: {
-            "driver": m.group("driver").lower().replace(" ", "_"),
+            "driver": _driver_id(m.group("driver")),
             "season": m.group("year")
         }
     },
     # Comparison patterns
-    r"(?i)compare.*(?P<item1>\w+\s+\w+).*(?P<item2>\w+\s+\w+)": {
+    r"compare\s+(?P<item1>\w+\s+\w+)\s+(?:and|vs\.?|versus|with|to)\s+(?P<item2>\w+\s+\w+)\b": {
+        # Literals the pattern cannot match without (lowercase substrings)
+        "keywords": ("compare",),
         "action": "compare",
         "entity": "drivers",
         "template": lambda m: {
-            "driver": [
-                m.group("item1").lower().replace(" ", "_"),
-                m.group("item2").lower().replace(" ", "_")
-            ]
+            "driver": [_driver_id(m.group("item1")), _driver_id(m.group("item2"))]
         }
     },
     # Historical patterns with statistics
-    r"(?i)(since|from)\s+(?P<year>\d{4}).*(?P<stat>win\s+rate|podiums?|points?).*(?P<team>\w+)": {
+    r"(since|from)\s+(?P<year>\d{4}).*?\b(?P<stat>win\s+rate|podiums?|points?)\b.*?\b(?:for|of)\s+(?P<team>\w+)": {
+        # Literals the pattern cannot match without (lowercase substrings)
+        "keywords": ("since", "from"),
         "action": "analyze",
         "entity": "standings/constructors",  # Changed to standings for statistical analysis
         "template": lambda m: {
@@ -49,7 +63,9 @@ QUERY_PATTERNS = {
         }
     },
     # Simple historical patterns
-    r"(?i)(since|from)\s+(?P<year>\d{4})": {
+    r"(since|from)\s+(?P<year>\d{4})": {
+        # Literals the pattern cannot match without (lowercase substrings)
+        "keywords": ("since", "from"),
         "action": "analyze",
         "entity": "constructors",
         "template": lambda m: {
@@ -58,7 +74,117 @@ QUERY_PATTERNS = {
     }
 }
 
-@dataclass
+Q2_MODEL = "gpt-4o-mini"
+Q2_CACHE_TTL = 3600  # seconds before a stored agent answer is asked again
+Q2_CACHE_SIZE = 2048  # answers kept in memory in front of the disk cache
+
+# cache key -> (stored at, response text), least recently used first
+_recent_completions: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+# cache key -> completion already in flight, awaited by identical concurrent calls
+_inflight_completions: Dict[str, "asyncio.Future[str]"] = {}
+
+def _remember_completion(key: str, stored_at: float, content: str):
+    _recent_completions[key] = (stored_at, content)
+    _recent_completions.move_to_end(key)
+    if len(_recent_completions) > Q2_CACHE_SIZE:
+        _recent_completions.popitem(last=False)
+
+async def _json_completion(client: AsyncOpenAI, prompt: str, temperature: float) -> Tuple[Dict[str, Any], bool]:
+    """
+    JSON-mode completion served from the shared response cache when possible
+    Returns the parsed object and whether it came from the cache
+    """
+    # Temperature is part of the key: a sampled answer is not interchangeable with a greedy one
+    cache_model = f"{Q2_MODEL}@{temperature}"
+    key = LLMResponseCache.make_key(cache_model, prompt)
+    
+    entry = _recent_completions.get(key)
+    if entry is not None and time.time() - entry[0] < Q2_CACHE_TTL:
+        _recent_completions.move_to_end(key)
+        return orjson.loads(entry[1]), True
+    inflight = _inflight_completions.get(key)
+    while inflight is not None:
+        # wait() neither cancels the shared future nor fails when it is cancelled
+        await asyncio.wait([inflight])
+        if not inflight.cancelled():
+            return orjson.loads(inflight.result()), True
+        # The request computing it was cancelled; compute it here instead
+        inflight = _inflight_completions.get(key)
+    
+    future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+    _inflight_completions[key] = future
+    try:
+        cache = default_llm_cache()
+        content = await asyncio.to_thread(cache.get, cache_model, prompt, max_age=Q2_CACHE_TTL)
+        cache_hit = content is not None
+        if not cache_hit:
+            response = await client.chat.completions.create(
+                model=Q2_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                response_format={"type": "json_object"}
+            )
+            content = response.choices[0].message.content
+        parsed = orjson.loads(content)
+        if isinstance(parsed, dict):
+            if not cache_hit:
+                await asyncio.to_thread(cache.set, cache_model, prompt, content)
+            _remember_completion(key, time.time(), content)
+        future.set_result(content)
+        return parsed, cache_hit
+    except Exception as e:
+        future.set_exception(e)
+        # Waiters re-raise it; mark it retrieved for the no-waiter case
+        future.exception()
+        raise
+    finally:
+        if not future.done():
+            # Cancelled before finishing; waiters retry rather than share the cancellation
+            future.cancel()
+        del _inflight_completions[key]
+
+# Compiled once at import; matching no longer goes through re's pattern cache
+COMPILED_QUERY_PATTERNS: List[Tuple[Pattern, Dict[str, Any]]] = [
+    (re.compile(pattern), config) for pattern, config in QUERY_PATTERNS.items()
+]
+
+# keyword -> indices of the compiled patterns that require it; one scan of the
+# query for any keyword narrows which regexes are worth running. This stands in
+# for a multi-pattern engine such as Hyperscan: behind the prefilter at most two
+# regexes run per query, and Hyperscan has no capture groups, so every hit would
+# be re-run through re for its named groups anyway.
+def _index_pattern_keywords() -> Dict[str, List[int]]:
+    index: Dict[str, List[int]] = {}
+    for i, (_, config) in enumerate(COMPILED_QUERY_PATTERNS):
+        for keyword in config.get("keywords", ()):
+            index.setdefault(keyword, []).append(i)
+    return index
+
+_PATTERN_KEYWORDS = _index_pattern_keywords()
+_KEYWORD_RE = re.compile("|".join(map(re.escape, _PATTERN_KEYWORDS)))
+# Patterns without keywords must always be tried
+_UNFILTERED_PATTERNS = frozenset(
+    i for i, (_, config) in enumerate(COMPILED_QUERY_PATTERNS) if not config.get("keywords")
+)
+
+def _candidate_patterns(lowered: str) -> List[Tuple[Pattern, Dict[str, Any]]]:
+    """Compiled patterns whose keywords occur in the lowercased query, in declaration order"""
+    indices = set(_UNFILTERED_PATTERNS)
+    for match in _KEYWORD_RE.finditer(lowered):
+        indices.update(_PATTERN_KEYWORDS[match.group()])
+    return [COMPILED_QUERY_PATTERNS[i] for i in sorted(indices)]
+
+@dataclass(frozen=True, slots=True)
+class NormalizedQuery:
+    """A query with its lowercase form, computed once and shared by every matcher"""
+    raw: str
+    lower: str
+
+    @classmethod
+    def of(cls, query: str) -> "NormalizedQuery":
+        return cls(query, query.lower())
+
+@dataclass(frozen=True, slots=True)
 class Q2Parameters:
     """
     Enhanced parameter structure for Q2 system
@@ -69,7 +195,7 @@ class Q2Parameters:
     parameters: Dict[str, Any]  # Extracted parameters
     confidence: float = 0.0  # Confidence score of the parsing
 
-@dataclass
+@dataclass(slots=True)
 class Q2Result:
     """
     Q2 processing result with metadata for analysis
@@ -79,72 +205,109 @@ class Q2Result:
     confidence: float
     processing_time: float
     agent_trace: List[str] = field(default_factory=list)  # Initialize as empty list
+    cache_hit: bool = False  # Every LLM answer came from the response cache
 
-class UnderstandingAgent:
-    """
-    Q2 Agent 1: Query Understanding and Parameter Recognition
-    Focuses on extracting structured information from natural language
-    """
-    
-    def __init__(self, client: AsyncOpenAI):
-        self.client = client
-        self.pattern_cache = {}
-        
-    @lru_cache(maxsize=100)
-    def _match_common_pattern(self, query: str) -> Optional[Tuple[Q2Parameters, List[str]]]:
-        """Try to match query against common patterns first"""
-        for pattern, config in QUERY_PATTERNS.items():
-            match = re.match(pattern, query)
-            if match:
-                params = config["template"](match)
-                return Q2Parameters(
-                    action=config["action"],
-                    entity=config["entity"],
-                    parameters=params,
-                    confidence=0.9  # High confidence for pattern matches
-                ), ["Matched common query pattern"]
-        return None
+@lru_cache(maxsize=1024)
+def _match_common_pattern_cached(lowered: str) -> Optional[Tuple[Q2Parameters, List[str]]]:
+    """Pattern match shared by all agents; module-level so the cache holds no instances"""
+    for pattern, config in _candidate_patterns(lowered):
+        match = pattern.match(lowered)
+        if match:
+            params = config["template"](match)
+            return Q2Parameters(
+                action=config["action"],
+                entity=config["entity"],
+                parameters=params,
+                confidence=0.9  # High confidence for pattern matches
+            ), ["Matched common query pattern"]
+    return None
 
-    async def parse_query(self, query: str) -> Tuple[Q2Parameters, List[str]]:
-        """
-        Parse natural language query into structured parameters
-        Returns both parameters and reasoning trace
-        """
-        # Q2 Enhancement: Detailed prompt for better parameter extraction
-        prompt = f"""You are an expert query parser for F1 data. Extract structured parameters from this query and return a JSON response.
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+# Session constraints none of the patterns capture
+_SESSION_TERMS_RE = re.compile(r"\b(?:qualifying|poles?|sprints?|practice|pit ?stops?|pits?|laps?|lap ?times?)\b")
+
+def _pattern_covers_query(lowered: str, parameters: Dict[str, Any]) -> bool:
+    """Whether a pattern match kept every year and session term of the query"""
+    seasons = parameters.get("season")
+    captured = set(seasons) if isinstance(seasons, list) else {seasons}
+    if any(year not in captured for year in _YEAR_RE.findall(lowered)):
+        return False
+    return _SESSION_TERMS_RE.search(lowered) is None
+
+# Agent prompts are built once; each call only concatenates the dynamic part
+_UNDERSTANDING_PROMPT_PREFIX = """You are an expert query parser for F1 data. Extract structured parameters from this query and return a JSON response.
         Focus on identifying:
         1. Primary action (rank, compare, fetch, analyze)
         2. Target entity (driver, constructor, race, qualifying)
         3. Specific parameters (season, driver, constructor, circuit)
         4. Temporal aspects (specific dates, ranges, 'last N races')
 
-        Query: {query}
+        Query: """
+_UNDERSTANDING_PROMPT_SUFFIX = """
 
         Return a JSON response in this exact format:
-        {{
+        {
             "action": string,
             "entity": string,
-            "parameters": {{
+            "parameters": {
                 "season": string | string[],
                 "driver": string | string[],
                 "constructor": string,
                 "circuit": string,
                 "round": string
-            }},
+            },
             "reasoning": string[]
-        }}
+        }
+        """
+_MAPPING_PROMPT_PREFIX = """Map these F1 query parameters to the correct API endpoint and return a JSON response.
+            Parameters: """
+_MAPPING_PROMPT_SUFFIX = """
+            
+            Available endpoints:
+            - /api/f1/races: Race results for a season
+            - /api/f1/qualifying: Qualifying results
+            - /api/f1/drivers: Results for specific drivers
+            - /api/f1/constructors: Results for constructors
+            - /api/f1/laps: Lap times
+            - /api/f1/standings/drivers: Driver standings
+            - /api/f1/standings/constructors: Constructor standings
+            
+            Return a JSON response as:
+            {
+                "endpoint": string,
+                "modified_params": object,
+                "reasoning": string[]
+            }
+            """
+
+# Fields scored by UnderstandingAgent._calculate_confidence
+_REQUIRED_FIELDS = frozenset({"action", "entity", "parameters"})
+_OPTIONAL_PARAMS = frozenset({"season", "driver", "constructor", "circuit", "round"})
+
+class UnderstandingAgent:
+    """
+    Q2 Agent 1: Query Understanding and Parameter Recognition
+    Focuses on extracting structured information from natural language
+    """
+    
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+        self.pattern_cache = {}
+        
+    def _match_common_pattern(self, query: NormalizedQuery) -> Optional[Tuple[Q2Parameters, List[str]]]:
+        """Try to match query against common patterns first"""
+        return _match_common_pattern_cached(query.lower)
+
+    async def parse_query(self, query: str) -> Tuple[Q2Parameters, List[str], bool]:
+        """
+        Parse natural language query into structured parameters
+        Returns parameters, reasoning trace and whether the response was cached
         """
+        # Q2 Enhancement: Detailed prompt for better parameter extraction
+        prompt = _UNDERSTANDING_PROMPT_PREFIX + query + _UNDERSTANDING_PROMPT_SUFFIX
         
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
-            
-            content = response.choices[0].message.content
-            parsed = json.loads(content)
+            parsed, cache_hit = await _json_completion(self.client, prompt, temperature=0.1)
             confidence = self._calculate_confidence(parsed)
             
             return Q2Parameters(
@@ -152,7 +315,7 @@ class UnderstandingAgent:
                 entity=parsed["entity"],
                 parameters=parsed["parameters"],
                 confidence=confidence
-            ), parsed.get("reasoning", [])
+            ), parsed.get("reasoning", []), cache_hit
             
         except Exception as e:
             logger.error(f"Q2 Understanding Agent error: {str(e)}")
@@ -160,17 +323,49 @@ class UnderstandingAgent:
 
     def _calculate_confidence(self, parsed: Dict) -> float:
         """Q2: Calculate confidence score based on parameter completeness"""
-        required_fields = {"action", "entity", "parameters"}
-        optional_params = {"season", "driver", "constructor", "circuit", "round"}
-        
         # Check required fields
-        base_score = sum(1 for field in required_fields if field in parsed) / len(required_fields)
+        base_score = sum(field in parsed for field in _REQUIRED_FIELDS) / len(_REQUIRED_FIELDS)
         
         # Check parameter completeness
-        param_score = sum(1 for param in optional_params if param in parsed.get("parameters", {})) / len(optional_params)
+        parameters = parsed.get("parameters") or {}
+        param_score = sum(param in parameters for param in _OPTIONAL_PARAMS) / len(_OPTIONAL_PARAMS)
         
         return (base_score * 0.6 + param_score * 0.4)  # Weighted average
 
+def _same_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    return params
+
+def _compared_drivers(params: Dict[str, Any]) -> Dict[str, Any]:
+    # The understanding schema and QUERY_PATTERNS both name the list "driver"
+    return {"driver": params.get("drivers") or params.get("driver", [])}
+
+# (action, entity) -> (endpoint, params transform)
+ENDPOINT_PATTERNS: Dict[Tuple[str, str], Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    # Enhanced pattern matching with more specific patterns
+    ("rank", "drivers"): ("/api/f1/standings/drivers", _same_params),
+    ("rank", "constructors"): ("/api/f1/standings/constructors", _same_params),
+    ("compare", "drivers"): ("/api/f1/drivers", _compared_drivers),
+    ("analyze", "laps"): ("/api/f1/laps", _same_params),
+    ("analyze", "qualifying"): ("/api/f1/qualifying", _same_params),
+    ("analyze", "standings/constructors"): ("/api/f1/standings/constructors", _same_params),  # For statistical analysis
+    ("analyze", "constructors"): ("/api/f1/constructors", _same_params),  # For raw results
+    ("fetch", "race"): ("/api/f1/results", _same_params),
+    ("fetch", "drivers"): ("/api/f1/drivers", _same_params),
+}
+
+def _build_endpoint_dispatch() -> Dict[str, Dict[str, Tuple[str, Callable]]]:
+    dispatch: Dict[str, Dict[str, Tuple[str, Callable]]] = {}
+    for (action, entity), pattern in ENDPOINT_PATTERNS.items():
+        dispatch.setdefault(action, {})[entity] = pattern
+    return dispatch
+
+# action -> entity -> (endpoint, transform); two string lookups, no key tuple per query
+_ENDPOINT_DISPATCH = _build_endpoint_dispatch()
+_NO_ENTITIES: Dict[str, Tuple[str, Callable]] = {}
+
+def _lookup_endpoint_pattern(action: str, entity: str) -> Optional[Tuple[str, Callable]]:
+    return _ENDPOINT_DISPATCH.get(action, _NO_ENTITIES).get(entity)
+
 class EndpointMappingAgent:
     """
     Q2 Agent 2: Endpoint Mapping
@@ -179,23 +374,11 @@ class EndpointMappingAgent:
     
     def __init__(self, client: AsyncOpenAI):
         self.client = client
-        self.endpoint_patterns = {
-            # Enhanced pattern matching with more specific patterns
-            ("rank", "drivers"): ("/api/f1/standings/drivers", lambda p: p),
-            ("rank", "constructors"): ("/api/f1/standings/constructors", lambda p: p),
-            ("compare", "drivers"): ("/api/f1/drivers", lambda p: {"driver": p.get("drivers", [])}),
-            ("analyze", "laps"): ("/api/f1/laps", lambda p: p),
-            ("analyze", "qualifying"): ("/api/f1/qualifying", lambda p: p),
-            ("analyze", "standings/constructors"): ("/api/f1/standings/constructors", lambda p: p),  # For statistical analysis
-            ("analyze", "constructors"): ("/api/f1/constructors", lambda p: p),  # For raw results
-            ("fetch", "race"): ("/api/f1/results", lambda p: p),
-            ("fetch", "drivers"): ("/api/f1/drivers", lambda p: p),
-        }
+        self.endpoint_patterns = ENDPOINT_PATTERNS
         
-    @lru_cache(maxsize=50)
-    def _get_endpoint_pattern(self, action: str, entity: str) -> Optional[Tuple[str, callable]]:
-        """Cached endpoint pattern lookup"""
-        return self.endpoint_patterns.get((action, entity))
+    def _get_endpoint_pattern(self, action: str, entity: str) -> Optional[Tuple[str, Callable]]:
+        """Endpoint pattern lookup through the prebuilt dispatch table"""
+        return _lookup_endpoint_pattern(action, entity)
 
     def _try_pattern_match(self, params: Q2Parameters) -> Optional[DataRequirements]:
         """Enhanced pattern matching with parameter transformation"""
@@ -208,51 +391,28 @@ class EndpointMappingAgent:
             )
         return None
 
-    async def map_to_endpoint(self, params: Q2Parameters) -> Tuple[DataRequirements, List[str]]:
+    async def map_to_endpoint(self, params: Q2Parameters) -> Tuple[DataRequirements, List[str], bool]:
         """
         Map Q2Parameters to specific API endpoint
-        Returns both requirements and reasoning trace
+        Returns requirements, reasoning trace and whether no uncached LLM call was needed
         """
         try:
             # Try pattern matching first
             pattern_result = self._try_pattern_match(params)
             if pattern_result:
-                return pattern_result, ["Pattern matched endpoint found"]
+                return pattern_result, ["Pattern matched endpoint found"], True
             
             # Fallback to AI mapping
-            prompt = f"""Map these F1 query parameters to the correct API endpoint and return a JSON response.
-            Parameters: {json.dumps(params.__dict__)}
-            
-            Available endpoints:
-            - /api/f1/races: Race results for a season
-            - /api/f1/qualifying: Qualifying results
-            - /api/f1/drivers: Results for specific drivers
-            - /api/f1/constructors: Results for constructors
-            - /api/f1/laps: Lap times
-            - /api/f1/standings/drivers: Driver standings
-            - /api/f1/standings/constructors: Constructor standings
+            # Only the fields the mapping needs; confidence is not part of the prompt
+            payload = {"action": params.action, "entity": params.entity, "parameters": params.parameters}
+            prompt = _MAPPING_PROMPT_PREFIX + orjson.dumps(payload).decode() + _MAPPING_PROMPT_SUFFIX
             
-            Return a JSON response as:
-            {{
-                "endpoint": string,
-                "modified_params": object,
-                "reasoning": string[]
-            }}
-            """
-            
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                response_format={"type": "json_object"}
-            )
-            
-            parsed = json.loads(response.choices[0].message.content)
+            parsed, cache_hit = await _json_completion(self.client, prompt, temperature=0)
             
             return DataRequirements(
                 endpoint=parsed["endpoint"],
                 params=parsed["modified_params"]
-            ), parsed.get("reasoning", [])
+            ), parsed.get("reasoning", []), cache_hit
             
         except Exception as e:
             logger.error(f"Q2 Endpoint Mapping error: {str(e)}")
@@ -274,14 +434,31 @@ class Q2Processor:
         Process query using Q2 multi-agent system
         Returns enhanced result with confidence and tracing
         """
+        # Step 0: A common pattern with a known endpoint needs neither LLM call, as
+        # long as the pattern captured every constraint the query states
+        normalized = NormalizedQuery.of(query)
+        matched = self.understanding_agent._match_common_pattern(normalized)
+        if matched and _pattern_covers_query(normalized.lower, matched[0].parameters):
+            params, pattern_trace = matched
+            # The match is cached and shared; give this result its own params
+            params = replace(params, parameters=dict(params.parameters))
+            requirements = self.mapping_agent._try_pattern_match(params)
+            if requirements:
+                return Q2Result(
+                    requirements=requirements,
+                    confidence=params.confidence * 0.7 + 0.3,
+                    processing_time=0.0,
+                    agent_trace=["Pattern Phase:"] + pattern_trace + ["Pattern matched endpoint found"]
+                )
+        
         trace = []
         try:
             # Step 1: Query Understanding
-            params, understanding_trace = await self.understanding_agent.parse_query(query)
+            params, understanding_trace, understanding_cached = await self.understanding_agent.parse_query(query)
             trace.extend(["Understanding Phase:"] + understanding_trace)
             
             # Step 2: Endpoint Mapping
-            requirements, mapping_trace = await self.mapping_agent.map_to_endpoint(params)
+            requirements, mapping_trace, mapping_cached = await self.mapping_agent.map_to_endpoint(params)
             trace.extend(["Mapping Phase:"] + mapping_trace)
             
             # Q2: Calculate overall confidence
@@ -291,7 +468,8 @@ class Q2Processor:
                 requirements=requirements,
                 confidence=confidence,
                 processing_time=0.0,  # TODO: Add timing
-                agent_trace=trace
+                agent_trace=trace,
+                cache_hit=understanding_cached and mapping_cached
             )
             
         except Exception as e:
@@ -0,0 +1,235 @@
+"""Exact and semantic caching of query processing results"""
+import asyncio
+import hashlib
+import logging
+import pickle
+import re
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from openai import AsyncOpenAI
+from .models import ProcessingResult
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+_NUMBER_RE = re.compile(r"\d+")
+
+# Bump whenever ProcessingResult or the saved layout changes, so older files are ignored;
+# 2 added ProcessingResult.fallback, which older pickles leave unset
+CACHE_SCHEMA_VERSION = 2
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different phrasings share a key"""
+    return " ".join(query.lower().split())
+
+def query_numbers(query: str) -> Tuple[str, ...]:
+    """Years and other numbers in a query, which embeddings barely tell apart"""
+    return tuple(sorted(_NUMBER_RE.findall(query)))
+
+class SemanticCache:
+    """Caches ProcessingResults by exact query hash, then by embedding similarity"""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        threshold: float = 0.95,
+        ttl: float = 3600,
+        min_confidence: float = 0.5,
+        max_size: int = 1000,
+        path: Optional[Path] = None
+    ):
+        self.client = client
+        self.threshold = threshold
+        self.ttl = ttl
+        self.min_confidence = min_confidence
+        self.max_size = max_size
+        # query hash -> (stored at, result); insertion order doubles as age order
+        self._entries: Dict[str, Tuple[float, ProcessingResult]] = {}
+        # query hash -> numbers in the query; a semantic hit must match them exactly
+        self._numbers: Dict[str, Tuple[str, ...]] = {}
+        # Unit-length float32 embeddings, one row per embedded query; rows
+        # [0, _size) are in use and _rows maps a query hash to its row
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._rows: Dict[str, int] = {}
+        self._row_keys: List[Optional[str]] = []
+        # query hash -> result of a computation already in progress
+        self._inflight: Dict[str, "asyncio.Future[ProcessingResult]"] = {}
+        self.path = path
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        return hashlib.sha256(normalize_query(query).encode()).hexdigest()
+
+    def exact_get(self, key: str) -> Optional[ProcessingResult]:
+        """Look up a result by query hash, dropping it if expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.time() - stored_at >= self.ttl:
+            self._evict(key)
+            return None
+        return result
+
+    async def semantic_get(self, key: str, query: str) -> Optional[ProcessingResult]:
+        """Look up the closest cached query above the similarity threshold"""
+        if not self._entries:
+            return None
+        vector = await self._embed(key, query)
+        if vector is None:
+            return None
+
+        # One matrix-vector product scores every cached query at once
+        scores = self._matrix[:self._size] @ vector
+        candidates = np.flatnonzero(scores >= self.threshold)
+        numbers = query_numbers(query)
+        best_key, best_score = None, 0.0
+        for row in candidates[np.argsort(-scores[candidates])]:
+            cached_key = self._row_keys[row]
+            if (cached_key is not None and cached_key != key and cached_key in self._entries
+                    and self._numbers.get(cached_key) == numbers):
+                best_key, best_score = cached_key, float(scores[row])
+                break
+
+        if best_key is None:
+            return None
+        logger.debug("Semantic cache hit (%.3f) for query: %s", best_score, query)
+        return self.exact_get(best_key)
+
+    async def get(self, query: str) -> Optional[ProcessingResult]:
+        key = self.query_hash(query)
+        return self.exact_get(key) or await self.semantic_get(key, query)
+
+    async def get_or_compute(
+        self,
+        query: str,
+        compute: Callable[[], Awaitable[ProcessingResult]]
+    ) -> Tuple[ProcessingResult, bool]:
+        """Return (result, cache hit); concurrent identical queries share one computation"""
+        key = self.query_hash(query)
+        inflight = self._inflight.get(key)
+        while inflight is not None:
+            # wait() neither cancels the shared future nor fails when it is cancelled
+            await asyncio.wait([inflight])
+            if not inflight.cancelled():
+                return inflight.result(), True
+            # The request computing it was cancelled; compute it here instead
+            inflight = self._inflight.get(key)
+        
+        future: "asyncio.Future[ProcessingResult]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            cached = self.exact_get(key) or await self.semantic_get(key, query)
+            if cached is not None:
+                future.set_result(cached)
+                return cached, True
+            result = await compute()
+            await self.put(query, result)
+            future.set_result(result)
+            return result, False
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved for the no-waiter case
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                # Cancelled before finishing; waiters retry rather than share the cancellation
+                future.cancel()
+            del self._inflight[key]
+
+    async def put(self, query: str, result: ProcessingResult):
+        """Store a result if it is confident enough to be reused; fallback defaults never are"""
+        if result.fallback or result.confidence < self.min_confidence:
+            return
+        key = self.query_hash(query)
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            self._evict(next(iter(self._entries)))
+        self._entries[key] = (time.time(), result)
+        self._numbers[key] = query_numbers(query)
+        if self._size > 2 * self.max_size:
+            # Reclaim evicted rows and embeddings of queries that never got cached
+            self._compact()
+        await self._embed(key, query)
+
+    async def _embed(self, key: str, query: str) -> Optional[np.ndarray]:
+        """Embed a query once and keep the normalized vector; None if embedding fails"""
+        row = self._rows.get(key)
+        if row is not None:
+            return self._matrix[row]
+        try:
+            response = await self.client.embeddings.create(model=EMBEDDING_MODEL, input=normalize_query(query))
+        except Exception as e:
+            logger.warning("Query embedding failed: %s", e)
+            return None
+        return self._add_embedding(key, np.asarray(response.data[0].embedding, dtype=np.float32))
+
+    def _add_embedding(self, key: str, raw: np.ndarray) -> np.ndarray:
+        norm = float(np.linalg.norm(raw)) or 1.0
+        if self._matrix is None:
+            self._matrix = np.zeros((64, raw.shape[0]), dtype=np.float32)
+        elif self._size == self._matrix.shape[0]:
+            # Grow geometrically so inserts stay amortized O(d)
+            grown = np.zeros((2 * self._size, self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix
+            self._matrix = grown
+        row = self._size
+        self._matrix[row] = raw / norm
+        self._size += 1
+        self._rows[key] = row
+        self._row_keys.append(key)
+        return self._matrix[row]
+
+    def _compact(self):
+        """Rebuild the matrix with only the rows of cached queries"""
+        keep = [(key, row) for key, row in self._rows.items() if key in self._entries]
+        matrix = self._matrix[[row for _, row in keep]] if keep else None
+        self._matrix, self._size, self._rows, self._row_keys = None, 0, {}, []
+        for i, (key, _) in enumerate(keep):
+            self._add_embedding(key, matrix[i])
+
+    def load(self):
+        """
+        Load unexpired entries saved by a previous run; a missing, corrupt or
+        outdated file is ignored
+        """
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                schema, entries, numbers, embeddings = pickle.load(f)
+        except Exception as e:
+            # Pickles from older code fail in many ways (renamed classes, other layouts)
+            logger.warning("Discarding unreadable query cache %s: %s", self.path, e)
+            return
+        if schema != CACHE_SCHEMA_VERSION:
+            return
+        oldest = time.time() - self.ttl
+        entries = {key: entry for key, entry in entries.items() if entry[0] > oldest}
+        self._entries.update(entries)
+        self._numbers.update((key, numbers[key]) for key in entries if key in numbers)
+        for key, vector in embeddings.items():
+            if key in entries and key not in self._rows:
+                self._add_embedding(key, np.asarray(vector, dtype=np.float32))
+
+    def save(self):
+        """Persist entries and embeddings for the next run"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'wb') as f:
+            embeddings = {key: self._matrix[row] for key, row in self._rows.items()}
+            pickle.dump((CACHE_SCHEMA_VERSION, self._entries, self._numbers, embeddings), f)
+
+    def _evict(self, key: str):
+        self._entries.pop(key, None)
+        self._numbers.pop(key, None)
+        row = self._rows.pop(key, None)
+        if row is not None:
+            # Zeroed rows never reach the threshold; _compact reclaims them
+            self._matrix[row] = 0
+            self._row_keys[row] = None
@@ -1,8 +1,12 @@
 """Test runner for Q2 query processing system"""
 import asyncio
-import json
+import orjson
 from datetime import datetime
+from typing import Any, BinaryIO, Dict
 from .processor import QueryProcessor
+from .semantic_cache import normalize_query
+
+MAX_CONCURRENT_QUERIES = 8
 
 async def run_tests():
     processor = QueryProcessor()
@@ -39,30 +43,41 @@ async def run_tests():
         "What is the historical win trend of Verstappen?"
     ]
     
-    results = []
+    # Overlap the LLM round-trips while staying within provider rate limits
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+    
+    async def run_query(query: str, out: BinaryIO) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await processor.process_query(query)
+                record = {
+                    "query": query,
+                    "endpoint": result.requirements.endpoint,
+                    "parameters": result.requirements.params,
+                    "confidence": result.confidence,
+                    "processing_time": result.processing_time,
+                    "source": result.source
+                }
+            except Exception as e:
+                record = {
+                    "query": query,
+                    "error": str(e)
+                }
+        # Append each result as one JSON line as soon as it completes
+        out.write(orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+        return record
+    
+    # Each distinct query runs once; repeats share its result
+    unique = {}
     for query in test_queries:
-        try:
-            result = await processor.process_query(query)
-            results.append({
-                "query": query,
-                "endpoint": result.requirements.endpoint,
-                "parameters": result.requirements.params,
-                "confidence": result.confidence,
-                "processing_time": result.processing_time,
-                "source": result.source
-            })
-        except Exception as e:
-            results.append({
-                "query": query,
-                "error": str(e)
-            })
+        unique.setdefault(normalize_query(query), query)
     
-    # Save results
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    with open(f'query_test_results_{timestamp}.json', 'w') as f:
-        json.dump(results, f, indent=2)
+    with open(f'query_test_results_{timestamp}.jsonl', 'wb') as f:
+        records = await asyncio.gather(*(run_query(query, f) for query in unique.values()))
+    by_key = dict(zip(unique, records))
     
-    return results
+    return [{**by_key[normalize_query(query)], "query": query} for query in test_queries]
 
 if __name__ == "__main__":
     results = asyncio.run(run_tests())
@@ -77,7 +92,7 @@ if __name__ == "__main__":
             print(f"Error: {result['error']}")
         else:
             print(f"Endpoint: {result['endpoint']}")
-            print(f"Parameters: {json.dumps(result['parameters'], indent=2)}")
+            print(f"Parameters: {orjson.dumps(result['parameters'], option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}")
             print(f"Confidence: {result['confidence']:.2f}")
             print(f"Processing Time: {result['processing_time']:.3f}s")
             print(f"Source: {result['source']}")
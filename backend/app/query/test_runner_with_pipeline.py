@@ -1,12 +1,16 @@
 """Test runner combining Q2 query processing with optimized pipeline"""
 
 import asyncio
-import json
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-from collections import defaultdict
+import re
+import time
+import orjson
+import numpy as np
+from time import perf_counter
+from typing import List, Dict, Any, Optional, Tuple
+from collections import Counter
 
 from .processor import QueryProcessor
+from .semantic_cache import normalize_query
 from ..pipeline.data2 import DataPipeline
 from ..pipeline.optimized_adapters import (
     OptimizedQueryAdapter,
@@ -14,18 +18,50 @@ from ..pipeline.optimized_adapters import (
     OptimizedValidationAdapter
 )
 
+MAX_CONCURRENT_QUERIES = 8
+
+# Categories in priority order with the substrings that select them
+QUERY_CATEGORIES = (
+    ("comparison", ("compare", "vs", "versus")),
+    ("stats", ("how many", "what is", "what's")),
+    ("historical", ("since", "from", "over")),
+    ("qualifying", ("qualifying", "pole")),
+    ("race", ("race", "podium", "win")),
+)
+# keyword -> priority of its category; one regex scan finds every keyword present
+_CATEGORY_PRIORITY = {
+    keyword: priority
+    for priority, (_, keywords) in enumerate(QUERY_CATEGORIES)
+    for keyword in keywords
+}
+_CATEGORY_RE = re.compile("|".join(map(re.escape, _CATEGORY_PRIORITY)))
+
+def _summary_stats(times: np.ndarray) -> Tuple[float, float, float, float]:
+    """Mean, p50, p95 and p99 of the recorded times, as whole-array numpy reductions"""
+    if not len(times):
+        return 0.0, 0.0, 0.0, 0.0
+    p50, p95, p99 = np.percentile(times, [50, 95, 99])
+    return float(times.mean()), float(p50), float(p95), float(p99)
+
 class TestMetricsCollector:
     def __init__(self):
         self.total_queries = 0
         self.successful_queries = 0
         self.failed_queries = 0
-        self.query_types = defaultdict(lambda: {"total": 0, "success": 0, "failure": 0})
-        self.processing_times = []
-        self.error_types = defaultdict(int)
+        # Preseeded with every category _categorize_query can return
+        self.query_types = {
+            category: {"total": 0, "success": 0, "failure": 0}
+            for category in (*(name for name, _ in QUERY_CATEGORIES), "other")
+        }
+        # Doubling buffer of processing times, reduced by _summary_stats
+        self._time_count = 0
+        self._times = np.empty(1024, dtype=np.float64)
+        self.error_types = Counter()
         self.cache_hits = 0
         self.cache_misses = 0
         
     def record_query(self, query: str, success: bool, time: float, error: Optional[str] = None):
+        """Record one query outcome; query is expected already normalized (lowercased)"""
         self.total_queries += 1
         if success:
             self.successful_queries += 1
@@ -33,7 +69,7 @@ class TestMetricsCollector:
             self.failed_queries += 1
             if error:
                 self.error_types[str(error)] += 1
-        self.processing_times.append(time)
+        self._record_time(time)
         
         # Categorize query
         query_type = self._categorize_query(query)
@@ -43,34 +79,38 @@ class TestMetricsCollector:
         else:
             self.query_types[query_type]["failure"] += 1
     
-    def _categorize_query(self, query: str) -> str:
-        query = query.lower()
-        if "compare" in query or "vs" in query or "versus" in query:
-            return "comparison"
-        if "how many" in query or "what is" in query or "what's" in query:
-            return "stats"
-        if "since" in query or "from" in query or "over" in query:
-            return "historical"
-        if "qualifying" in query or "pole" in query:
-            return "qualifying"
-        if "race" in query or "podium" in query or "win" in query:
-            return "race"
-        return "other"
+    def _record_time(self, time: float):
+        if self._time_count == len(self._times):
+            self._times = np.resize(self._times, 2 * len(self._times))
+        self._times[self._time_count] = time
+        self._time_count += 1
+    
+    def _categorize_query(self, lowered: str) -> str:
+        priorities = [_CATEGORY_PRIORITY[m.group()] for m in _CATEGORY_RE.finditer(lowered)]
+        if not priorities:
+            return "other"
+        return QUERY_CATEGORIES[min(priorities)][0]
     
     def get_summary(self) -> Dict[str, Any]:
-        avg_time = sum(self.processing_times) / len(self.processing_times) if self.processing_times else 0
+        avg_time, p50, p95, p99 = _summary_stats(self._times[:self._time_count])
         success_rate = (self.successful_queries / self.total_queries * 100) if self.total_queries else 0
         
         return {
             "total_queries": self.total_queries,
             "success_rate": f"{success_rate:.1f}%",
             "average_processing_time": f"{avg_time:.2f}s",
+            "processing_time_percentiles": {
+                "p50": f"{p50:.2f}s",
+                "p95": f"{p95:.2f}s",
+                "p99": f"{p99:.2f}s"
+            },
             "query_type_performance": {
                 qtype: {
                     "total": stats["total"],
                     "success_rate": f"{(stats['success'] / stats['total'] * 100):.1f}%" if stats['total'] > 0 else "0%"
                 }
                 for qtype, stats in self.query_types.items()
+                if stats["total"]  # Only categories that actually occurred
             },
             "error_distribution": dict(self.error_types),
             "cache_performance": {
@@ -89,34 +129,52 @@ async def run_pipeline_tests(queries: List[str]) -> Dict[str, Any]:
     validation_adapter = OptimizedValidationAdapter()
     metrics = TestMetricsCollector()
     
-    for query in queries:
-        start_time = datetime.now().timestamp()
-        try:
-            # Process query
-            query_result = await processor.process_query(query)
-            
-            # Adapt query result
-            adapted_query = await query_adapter.adapt(query_result)
-            if adapted_query.cache_hit:
-                metrics.cache_hits += 1
-            else:
-                metrics.cache_misses += 1
-            
-            # Process through pipeline
-            requirements = adapted_query.to_data_requirements()
-            pipeline_response = await pipeline.process(requirements)
-            
-            # Adapt pipeline result
-            pipeline_result = await result_adapter.adapt_pipeline_result(pipeline_response, start_time)
-            
-            # Record metrics
-            processing_time = datetime.now().timestamp() - start_time
-            success = pipeline_result.success and pipeline_result.data is not None
-            metrics.record_query(query, success, processing_time, pipeline_result.error)
-            
-        except Exception as e:
-            processing_time = datetime.now().timestamp() - start_time
-            metrics.record_query(query, False, processing_time, str(e))
+    # Overlap queries end to end while staying within provider rate limits
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+    
+    async def run_query(query: str) -> Tuple[bool, float, Optional[str]]:
+        """Run one query end to end; returns (success, processing time, error)"""
+        async with semaphore:
+            start = perf_counter()
+            # The result adapter reports elapsed time against a wall-clock start
+            wall_start = time.time()
+            try:
+                # Process query
+                query_result = await processor.process_query(query)
+                
+                # Adapt query result
+                adapted_query = await query_adapter.adapt(query_result)
+                if adapted_query.cache_hit:
+                    metrics.cache_hits += 1
+                else:
+                    metrics.cache_misses += 1
+                
+                # Process through pipeline
+                requirements = adapted_query.to_data_requirements()
+                pipeline_response = await pipeline.process(requirements)
+                
+                # Adapt pipeline result
+                pipeline_result = await result_adapter.adapt_pipeline_result(pipeline_response, wall_start)
+                
+                success = pipeline_result.success and pipeline_result.data is not None
+                return success, perf_counter() - start, pipeline_result.error
+                
+            except Exception as e:
+                return False, perf_counter() - start, str(e)
+    
+    # Normalize once; the key both dedupes runs and drives categorization
+    normalized = [normalize_query(query) for query in queries]
+    
+    # Each distinct query runs once; repeats share its outcome
+    unique = {}
+    for key, query in zip(normalized, queries):
+        unique.setdefault(key, query)
+    outcomes = dict(zip(unique, await asyncio.gather(*(run_query(q) for q in unique.values()))))
+    
+    # Record metrics for every submitted query, in order
+    for key in normalized:
+        success, processing_time, error = outcomes[key]
+        metrics.record_query(key, success, processing_time, error)
     
     return metrics.get_summary()
 
@@ -155,7 +213,7 @@ async def main():
     
     results = await run_pipeline_tests(test_queries)
     print("\nTest Results Summary:")
-    print(json.dumps(results, indent=2))
+    print(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode())
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
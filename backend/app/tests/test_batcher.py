@@ -0,0 +1,51 @@
+"""Tests for batched legacy completions."""
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from app.query.batcher import CompletionBatcher
+
+class FakeCompletions:
+    """Answers single queries with their text and batches with one result too few"""
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, model, messages, **kwargs):
+        content = messages[-1]["content"]
+        self.requests.append(content)
+        if content.startswith("Query: "):
+            reply = {"query": content[len("Query: "):]}
+        else:
+            reply = {"results": [{"query": "only one"}]}
+        message = SimpleNamespace(content=orjson.dumps(reply).decode())
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+@pytest.mark.asyncio
+async def test_bad_batch_reply_retries_queries_singly():
+    """A batched reply with the wrong number of results falls back to one request per query"""
+    completions = FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    batcher = CompletionBatcher(client, "model", "instructions")
+    answers = await asyncio.gather(batcher.submit("first"), batcher.submit("second"))
+    await batcher.aclose()
+    assert [orjson.loads(answer) for answer in answers] == [{"query": "first"}, {"query": "second"}]
+    assert len(completions.requests) == 3
+
+class StalledCompletions:
+    """Never answers, so requests stay in flight until cancelled"""
+    async def create(self, model, messages, **kwargs):
+        await asyncio.sleep(3600)
+
+@pytest.mark.asyncio
+async def test_aclose_fails_waiting_queries():
+    """Closing the batcher cancels its tasks and fails queries still waiting"""
+    client = SimpleNamespace(chat=SimpleNamespace(completions=StalledCompletions()))
+    batcher = CompletionBatcher(client, "model", "instructions")
+    pending = asyncio.create_task(batcher.submit("first"))
+    await asyncio.sleep(batcher.max_wait * 2)
+    await batcher.aclose()
+    with pytest.raises(RuntimeError, match="closed"):
+        await pending
+    assert batcher._collector is None and not batcher._batches
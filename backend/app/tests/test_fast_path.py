@@ -0,0 +1,61 @@
+"""Tests for local query resolution without an LLM call."""
+import pytest
+
+from app.query.fast_path import match_rules, match_template, resolve_fast_path
+
+@pytest.mark.parametrize("query", [
+    "Hamilton and Verstappen race results 2021",
+    "Red Bull and Ferrari pit stops in 2022",
+])
+def test_rules_reject_multiple_entities(query):
+    """Questions about several drivers or teams are left to the LLM"""
+    assert match_rules(query) is None
+
+@pytest.mark.parametrize("query", [
+    "Napoleon 2020 qualifying",
+    "Grace period 2020 results",
+])
+def test_rules_match_keywords_as_whole_words(query):
+    """Keywords inside other words do not select an endpoint"""
+    assert match_rules(query) is None
+
+def test_rules_reject_season_fetch_with_other_constraints():
+    """A season-only request is not used when the question asks for more"""
+    assert match_rules("Which races had safety cars deployed in 2022?") is None
+
+def test_rules_season_only_request():
+    """A plain season question still resolves locally"""
+    requirements = match_rules("Show the 2021 race results")
+    assert requirements is not None
+    assert requirements.endpoint == "/api/f1/races"
+    assert requirements.params == {"season": "2021"}
+
+def test_rules_single_driver():
+    """One driver, one year and one keyword resolve to a driver request"""
+    requirements = match_rules("Hamilton race results 2021")
+    assert requirements is not None
+    assert requirements.endpoint == "/api/f1/races"
+    assert requirements.params == {"season": "2021", "driver": "hamilton"}
+
+def test_rules_single_constructor():
+    """Multi-word keywords and team names resolve together"""
+    requirements = match_rules("Ferrari pit stops in 2022")
+    assert requirements is not None
+    assert requirements.endpoint == "/api/f1/pitstops"
+    assert requirements.params == {"season": "2022", "constructor": "ferrari"}
+
+@pytest.mark.parametrize("query", [
+    "Show Lewis Hamilton and Charles Leclerc results in 2019",
+    "Lewis Hamilton and Charles Leclerc qualifying in 2019",
+])
+def test_template_rejects_second_driver(query):
+    """Single-driver templates do not answer for only the last name"""
+    assert match_template(query) is None
+    assert resolve_fast_path(query) is None
+
+def test_template_single_driver_results():
+    """A single named driver still matches the results template"""
+    requirements = match_template("What were Max Verstappen's race results in 2023?")
+    assert requirements is not None
+    assert requirements.endpoint == "/api/f1/races"
+    assert requirements.params == {"driver": "max_verstappen", "season": "2023"}
@@ -70,4 +70,23 @@ def test_analyze_code_execution_error():
     assert response.status_code == 400
     data = response.json()
     assert data["success"] == False
-    assert "Code execution failed" in data["details"] 
\ No newline at end of file
+    assert "Code execution failed" in data["details"]
+
+
+@pytest.fixture
+def unconfigured_processor(monkeypatch):
+    """Build processors without an API key, leaving the shared processor untouched"""
+    from app import main
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    # processor_dependency looks get_processor up on the module, so swap it there
+    monkeypatch.setattr(main, "get_processor", QueryProcessor)
+
+
+def test_analyze_processor_unavailable(unconfigured_processor):
+    """A processor that cannot be set up yields a 503 with the usual error body"""
+    response = client.post("/api/v1/analyze", json={"query": "Show Ferrari's performance in 2023"})
+    assert response.status_code == 503
+    data = response.json()
+    assert data["success"] == False
+    assert data["error"] == "Analysis failed"
+    assert "details" in data
@@ -0,0 +1,53 @@
+"""Tests for the Q2 common-pattern short-circuit."""
+import pytest
+
+from app.query.models import DataRequirements
+from app.query.q2_assistants import Q2Parameters, Q2Processor
+
+AGENT_REQUIREMENTS = DataRequirements(endpoint="/api/f1/qualifying", params={"season": "2021"})
+
+@pytest.fixture
+def processor(monkeypatch):
+    """Q2 processor whose agents record the queries they are asked to handle"""
+    processor = Q2Processor(client=None)
+    processor.agent_queries = []
+
+    async def parse_query(query):
+        processor.agent_queries.append(query)
+        return Q2Parameters(action="fetch", entity="qualifying", parameters={"season": "2021"}, confidence=0.8), [], False
+
+    async def map_to_endpoint(params):
+        return AGENT_REQUIREMENTS, [], False
+
+    monkeypatch.setattr(processor.understanding_agent, "parse_query", parse_query)
+    monkeypatch.setattr(processor.mapping_agent, "map_to_endpoint", map_to_endpoint)
+    return processor
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", [
+    "Compare Lewis Hamilton and Max Verstappen in 2021 qualifying",
+    "Show results of Max Verstappen in 2023 qualifying",
+])
+async def test_partial_pattern_match_uses_agents(processor, query):
+    """Years or sessions the pattern did not capture send the query to the agents"""
+    result = await processor.process_query(query)
+    assert processor.agent_queries == [query]
+    assert result.requirements == AGENT_REQUIREMENTS
+
+@pytest.mark.asyncio
+async def test_full_pattern_match_skips_agents(processor):
+    """A fully captured query is answered by the pattern alone"""
+    result = await processor.process_query("Show results of Max Verstappen in 2023")
+    assert processor.agent_queries == []
+    assert result.requirements == DataRequirements(
+        endpoint="/api/f1/drivers",
+        params={"driver": "max_verstappen", "season": "2023"}
+    )
+    assert result.cache_hit is False
+
+@pytest.mark.asyncio
+async def test_pattern_driver_ids_match_fast_path(processor):
+    """Pattern matches use the fast path's driver ids"""
+    result = await processor.process_query("Compare Lewis Hamilton with Max Verstappen")
+    assert processor.agent_queries == []
+    assert result.requirements.params == {"driver": ["hamilton", "max_verstappen"]}
@@ -0,0 +1,90 @@
+"""Tests for the query result cache."""
+import asyncio
+import pickle
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.query.models import DataRequirements, ProcessingResult
+from app.query.semantic_cache import CACHE_SCHEMA_VERSION, SemanticCache
+
+class FakeEmbeddings:
+    """Embeds every query to the same vector, so any two queries look identical"""
+    async def create(self, model, input):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0, 0.0])])
+
+def make_result(fallback=False):
+    return ProcessingResult(
+        requirements=DataRequirements(endpoint="/api/f1/races", params={"season": "2020"}),
+        processing_time=0.1,
+        source='legacy',
+        confidence=0.5,
+        fallback=fallback
+    )
+
+@pytest.fixture
+def cache():
+    return SemanticCache(SimpleNamespace(embeddings=FakeEmbeddings()))
+
+@pytest.mark.asyncio
+async def test_fallback_results_are_not_cached(cache):
+    """Default requirements returned after an error are never reused"""
+    await cache.put("Hamilton wins 2020", make_result(fallback=True))
+    assert await cache.get("Hamilton wins 2020") is None
+
+@pytest.mark.asyncio
+async def test_semantic_hit_requires_same_numbers(cache):
+    """Similar queries about different years do not share a result"""
+    result = make_result()
+    await cache.put("Hamilton wins 2020", result)
+    assert await cache.get("How many wins did Hamilton have in 2020") == result
+    assert await cache.get("Hamilton wins 2021") is None
+
+@pytest.mark.asyncio
+async def test_cancelled_computation_is_retried_by_waiters(cache):
+    """A waiter whose leader is cancelled computes the result itself"""
+    started = asyncio.Event()
+    result = make_result()
+
+    async def never_finishes():
+        started.set()
+        await asyncio.sleep(3600)
+
+    async def compute():
+        return result
+
+    leader = asyncio.create_task(cache.get_or_compute("Hamilton wins 2020", never_finishes))
+    await started.wait()
+    waiter = asyncio.create_task(cache.get_or_compute("Hamilton wins 2020", compute))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await waiter == (result, False)
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+def test_saved_entries_reload(tmp_path):
+    """Entries saved by one run are served by the next"""
+    path = tmp_path / "query_results.pkl"
+    client = SimpleNamespace(embeddings=FakeEmbeddings())
+    first = SemanticCache(client, path=path)
+    result = make_result()
+    first._entries[first.query_hash("Hamilton wins 2020")] = (time.time(), result)
+    first.save()
+    second = SemanticCache(client, path=path)
+    second.load()
+    assert second.exact_get(second.query_hash("Hamilton wins 2020")) == result
+
+@pytest.mark.parametrize("payload", [
+    # Written by an older schema
+    pickle.dumps((CACHE_SCHEMA_VERSION - 1, {}, {}, {})),
+    # References a class that no longer exists
+    b"cmissing_module\nMissing\n.",
+])
+def test_outdated_cache_file_is_ignored(tmp_path, payload):
+    """Files from other code are discarded instead of failing the load"""
+    path = tmp_path / "query_results.pkl"
+    path.write_bytes(payload)
+    cache = SemanticCache(SimpleNamespace(embeddings=FakeEmbeddings()), path=path)
+    cache.load()
+    assert cache._entries == {}